@@ -111,6 +111,21 @@ CREATE TABLE message_references (
     UNIQUE (user_message_id, user_id)
 );
 
+-- Webhook Events Table: Durable queue of verified Stripe webhook events
+CREATE TABLE webhook_events (
+    id BIGSERIAL PRIMARY KEY,
+    event_id VARCHAR(255) NOT NULL UNIQUE, -- Stripe event ID; dedupes redeliveries
+    event_type VARCHAR(100) NOT NULL,
+    payload JSONB NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending', -- pending, processing, done, failed
+    attempts INT NOT NULL DEFAULT 0,
+    locked_at TIMESTAMPTZ,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    processed_at TIMESTAMPTZ
+);
+
+CREATE INDEX idx_webhook_events_pending ON webhook_events(id) WHERE status IN ('pending', 'processing');
+
 -- Add missing columns to users table (these will be added by migration)
 -- Note: These columns are already in the application's migration function
 -- last_message_at TIMESTAMPTZ,
@@ -36,6 +36,7 @@ async def create_application() -> Application:
     # Set default settings for the bot
     defaults = Defaults(
         parse_mode=ParseMode.MARKDOWN,
+        block=False,  # Don't serialize handler callbacks across updates
     )
 
     # Create the Application instance
@@ -5,11 +5,20 @@ This module provides caching functionality for frequently accessed data
 to improve performance and reduce database load.
 """
 
+import json
 import logging
 import time
 from typing import Any, Optional, Dict
 from threading import RLock
 
+from src.config import REDIS_URL
+
+# Redis is optional; without it every cache stays per-process
+try:
+    import redis
+except ImportError:
+    redis = None
+
 logger = logging.getLogger(__name__)
 
 
@@ -154,6 +163,25 @@ class SimpleCache:
 # Global cache instance
 cache = SimpleCache()
 
+# Shared Redis client, created on first use when REDIS_URL is set
+_redis_client = None
+
+
+def _get_redis_client():
+    """
+    Get the shared Redis client.
+
+    Returns:
+        Redis client, or None if Redis is not configured or installed
+    """
+    global _redis_client
+    if _redis_client is None and redis is not None and REDIS_URL:
+        # Short timeouts: a slow Redis must not be worse than the database
+        _redis_client = redis.Redis.from_url(
+            REDIS_URL, socket_timeout=0.5, socket_connect_timeout=0.5
+        )
+    return _redis_client
+
 
 # Convenience functions for bot settings
 def get_bot_setting_cached(key: str) -> Optional[str]:
@@ -242,11 +270,195 @@ def invalidate_user_cache(user_id: int) -> None:
     Args:
         user_id: User's Telegram ID
     """
-    cache_key = f"user:{user_id}"
-    cache.delete(cache_key)
+    cache.delete(f"user:{user_id}")
+    cache.delete(f"user_banned:{user_id}")
     logger.debug(f"Invalidated user cache for {user_id}")
 
 
+def is_user_banned_cached(user_id: int, ttl: int = 60) -> bool:
+    """
+    Check whether a user is banned, from cache or database.
+
+    Args:
+        user_id: User's Telegram ID
+        ttl: Cache TTL in seconds (default 1 minute); bounds how long a
+            ban made in another worker takes to apply here
+
+    Returns:
+        True if the user is banned
+    """
+    cache_key = f"user_banned:{user_id}"
+
+    # Try cache first; False is a valid cached answer
+    value = cache.get(cache_key)
+    if value is not None:
+        return value
+
+    # Fallback to database
+    from src.database import is_user_banned
+
+    is_banned = is_user_banned(user_id)
+    cache.set(cache_key, is_banned, ttl=ttl)
+
+    return is_banned
+
+
+def get_product_by_price_id_cached(
+    stripe_price_id: str,
+    ttl: int = 60,
+    negative_ttl: int = 5,
+    shared_ttl: int = 3600,
+) -> Optional[Dict[str, Any]]:
+    """
+    Get active product by Stripe price ID from cache, Redis or database.
+
+    Args:
+        stripe_price_id: Stripe price ID
+        ttl: Cache TTL in seconds for found products (default 1 minute)
+        negative_ttl: Cache TTL in seconds for unknown price IDs, kept short
+            so newly added products show up quickly
+        shared_ttl: Redis TTL in seconds for found products (default 1 hour)
+
+    Returns:
+        Product data or None. Products loaded from Redis have
+        non-JSON values (e.g. timestamps) as strings.
+    """
+    cache_key = f"product_price:{stripe_price_id}"
+
+    # Try cache first; False marks a cached "not found"
+    value = cache.get(cache_key)
+    if value is not None:
+        return value or None
+
+    # Then the cache shared with other workers
+    redis_client = _get_redis_client()
+    redis_key = f"stripe_price:{stripe_price_id}"
+    if redis_client is not None:
+        try:
+            raw = redis_client.get(redis_key)
+            if raw is not None:
+                product = json.loads(raw)
+                cache.set(cache_key, product, ttl=ttl)
+                return product
+        except Exception as e:
+            logger.warning("Redis lookup for price %s failed: %s", stripe_price_id, e)
+
+    # Fallback to database
+    try:
+        from src.database import get_product_by_stripe_price_id
+
+        product = get_product_by_stripe_price_id(stripe_price_id)
+
+        if product:
+            cache.set(cache_key, product, ttl=ttl)
+            if redis_client is not None:
+                try:
+                    redis_client.setex(
+                        redis_key, shared_ttl, json.dumps(product, default=str)
+                    )
+                except Exception as e:
+                    logger.warning(
+                        "Redis store for price %s failed: %s", stripe_price_id, e
+                    )
+        else:
+            cache.set(cache_key, False, ttl=negative_ttl)
+
+        return product
+    except Exception as e:
+        logger.error(f"Failed to get product for price {stripe_price_id}: {e}")
+        return None
+
+
+def get_stripe_customer_id_cached(user_id: int, ttl: int = 3600) -> Optional[str]:
+    """
+    Get a user's Stripe customer ID from cache or database.
+
+    Args:
+        user_id: User's Telegram ID
+        ttl: Cache TTL in seconds (default 1 hour)
+
+    Returns:
+        Stripe customer ID or None if the user has none yet
+    """
+    cache_key = f"stripe_customer:{user_id}"
+
+    # Try cache first
+    value = cache.get(cache_key)
+    if value is not None:
+        return value
+
+    # Fallback to database
+    try:
+        from src.database import get_user
+
+        user_data = get_user(user_id)
+        customer_id = user_data.get("stripe_customer_id") if user_data else None
+
+        if customer_id:
+            # A customer ID never changes once assigned
+            cache.set(cache_key, customer_id, ttl=ttl)
+
+        return customer_id
+    except Exception as e:
+        logger.error(f"Failed to get Stripe customer for {user_id}: {e}")
+        return None
+
+
+def set_stripe_customer_id_cached(
+    user_id: int, customer_id: str, ttl: int = 3600
+) -> None:
+    """
+    Cache a newly assigned Stripe customer ID.
+
+    Args:
+        user_id: User's Telegram ID
+        customer_id: Stripe customer ID
+        ttl: Cache TTL in seconds (default 1 hour)
+    """
+    cache.set(f"stripe_customer:{user_id}", customer_id, ttl=ttl)
+
+
+def has_user_made_purchases_cached(user_id: int, ttl: int = 3600) -> bool:
+    """
+    Check whether a user has completed a purchase, from cache or database.
+
+    Only positive answers are cached: once a user has purchased, that
+    never becomes false again.
+
+    Args:
+        user_id: User's Telegram ID
+        ttl: Cache TTL in seconds (default 1 hour)
+
+    Returns:
+        True if the user has at least one completed purchase
+    """
+    cache_key = f"has_purchased:{user_id}"
+
+    # Try cache first
+    if cache.get(cache_key):
+        return True
+
+    # Fallback to database
+    from src.database import has_user_made_purchases
+
+    has_purchased = has_user_made_purchases(user_id)
+    if has_purchased:
+        cache.set(cache_key, True, ttl=ttl)
+
+    return has_purchased
+
+
+def mark_user_has_purchased(user_id: int, ttl: int = 3600) -> None:
+    """
+    Record a completed purchase in the cache.
+
+    Args:
+        user_id: User's Telegram ID
+        ttl: Cache TTL in seconds (default 1 hour)
+    """
+    cache.set(f"has_purchased:{user_id}", True, ttl=ttl)
+
+
 # Periodic cleanup (could be called from a scheduled task)
 def periodic_cache_cleanup() -> None:
     """Perform periodic cache maintenance."""
@@ -124,7 +124,12 @@ WEBHOOK_URL = get_env_var("WEBHOOK_URL", required=False)
 
 DATABASE_URL = get_env_var("DATABASE_URL")
 DB_POOL_MIN_CONN = get_env_int("DB_POOL_MIN_CONN", required=False, default=2)
-DB_POOL_MAX_CONN = get_env_int("DB_POOL_MAX_CONN", required=False, default=10)
+# Per-worker maximum; derived from GUNICORN_THREADS when unset
+DB_POOL_MAX_CONN = get_env_int("DB_POOL_MAX_CONN", required=False)
+
+# Connections each worker uses outside request threads: the Stripe webhook
+# drain thread and the Telegram loop with its to_thread offloads
+DB_POOL_BACKGROUND_CONN = 3
 
 # =============================================================================
 # STRIPE PAYMENT CONFIGURATION (REQUIRED)
@@ -132,12 +137,21 @@ DB_POOL_MAX_CONN = get_env_int("DB_POOL_MAX_CONN", required=False, default=10)
 
 STRIPE_API_KEY = get_env_var("STRIPE_API_KEY")
 STRIPE_WEBHOOK_SECRET = get_env_var("STRIPE_WEBHOOK_SECRET")
+STRIPE_CUSTOMER_EMAIL_DOMAIN = get_env_var(
+    "STRIPE_CUSTOMER_EMAIL_DOMAIN", required=False, default="example.com"
+)
+# Call Stripe from every worker at startup to verify the API key
+STRIPE_STARTUP_PROBE = get_env_bool(
+    "STRIPE_STARTUP_PROBE", required=False, default=False
+)
 
 # =============================================================================
 # APPLICATION CONFIGURATION (OPTIONAL)
 # =============================================================================
 
 FLASK_DEBUG = get_env_bool("FLASK_DEBUG", required=False, default=False)
+# Optional shared cache; per-process caching is used when unset
+REDIS_URL = get_env_var("REDIS_URL", required=False)
 LOG_LEVEL = get_env_var("LOG_LEVEL", required=False, default="INFO")
 PORT = get_env_int("PORT", required=False, default=8000)
 
@@ -149,7 +163,7 @@ GUNICORN_WORKERS = get_env_int("GUNICORN_WORKERS", required=False, default=4)
 GUNICORN_THREADS = get_env_int("GUNICORN_THREADS", required=False, default=2)
 GUNICORN_TIMEOUT = get_env_int("GUNICORN_TIMEOUT", required=False, default=30)
 GUNICORN_WORKER_CLASS = get_env_var(
-    "GUNICORN_WORKER_CLASS", required=False, default="sync"
+    "GUNICORN_WORKER_CLASS", required=False, default="gthread"
 )
 
 # =============================================================================
@@ -226,23 +240,27 @@ def validate_config() -> None:
 
 def get_db_pool_size() -> int:
     """
-    Calculate optimal database pool size based on Gunicorn configuration.
+    Calculate the database pool size for one Gunicorn worker.
 
     Returns:
-        Recommended maximum pool size
+        Maximum pool size for this worker's connection pool
 
     Note:
-        Uses formula: pool_size >= (gunicorn_workers * gunicorn_threads)
-        as recommended in the architectural review.
+        Every worker process opens its own pool, so the size covers only the
+        worker's own request threads plus its background threads. The total
+        across the deployment is GUNICORN_WORKERS times this value.
     """
-    recommended_size = GUNICORN_WORKERS * GUNICORN_THREADS
+    recommended_size = GUNICORN_THREADS + DB_POOL_BACKGROUND_CONN
     configured_size = DB_POOL_MAX_CONN
 
+    if configured_size is None:
+        return recommended_size
+
     if configured_size < recommended_size:
         logger.warning(
             f"DB_POOL_MAX_CONN ({configured_size}) is smaller than recommended "
-            f"size ({recommended_size}) for {GUNICORN_WORKERS} workers with "
-            f"{GUNICORN_THREADS} threads each"
+            f"per-worker size ({recommended_size}) for {GUNICORN_THREADS} "
+            f"threads plus {DB_POOL_BACKGROUND_CONN} background connections"
         )
 
     return max(configured_size, recommended_size)
@@ -268,6 +286,10 @@ if DEV_MODE:
         f"  - STRIPE_API_KEY: {'***' + STRIPE_API_KEY[-8:] if STRIPE_API_KEY else 'Not set'}"
     )
     logger.info(f"  - DB_POOL_MAX_CONN: {DB_POOL_MAX_CONN}")
-    logger.info(f"  - Recommended pool size: {get_db_pool_size()}")
+    logger.info(f"  - Pool size per worker: {get_db_pool_size()}")
+    logger.info(
+        f"  - Max connections: {get_db_pool_size() * GUNICORN_WORKERS} "
+        f"({GUNICORN_WORKERS} workers)"
+    )
     logger.info(f"  - DEV_MODE: {DEV_MODE}")
     logger.info(f"  - FLASK_DEBUG: {FLASK_DEBUG}")
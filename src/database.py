@@ -7,6 +7,8 @@ for thread-safe operations in a Gunicorn multi-worker environment.
 
 import contextlib
 import logging
+import secrets
+import time
 import uuid
 from typing import Optional, Dict, List, Any, Union
 import psycopg2
@@ -15,12 +17,16 @@ import psycopg2.extras
 from psycopg2.extras import RealDictCursor
 
 from src.config import DATABASE_URL, DB_POOL_MIN_CONN, get_db_pool_size
+from src.cache import invalidate_user_cache
 
 logger = logging.getLogger(__name__)
 
 # Global connection pool
 connection_pool: Optional[psycopg2.pool.ThreadedConnectionPool] = None
 
+# Monotonic time of the last successful pooled transaction, used by health checks
+_last_db_success = float("-inf")
+
 
 class DatabaseError(Exception):
     """Raised when database operations fail."""
@@ -72,12 +78,36 @@ def close_connection_pool() -> None:
         logger.info("Connection pool closed")
 
 
+def pool_is_healthy(max_age_seconds: float = 30) -> bool:
+    """
+    Check database health without a round-trip when traffic proves it.
+    Only runs SELECT 1 if no transaction has succeeded recently.
+
+    Args:
+        max_age_seconds: How long a successful transaction counts as proof
+
+    Returns:
+        True if the pool is usable
+    """
+    if connection_pool is None or connection_pool.closed:
+        return False
+    if time.monotonic() - _last_db_success < max_age_seconds:
+        return True
+    try:
+        execute_query("SELECT 1", fetch_one=True)
+        return True
+    except DatabaseError:
+        return False
+
+
 @contextlib.contextmanager
 def get_db_connection():
     """
     Context manager to get a connection from the pool.
     Ensures connections are properly returned to the pool.
     """
+    global _last_db_success
+
     if connection_pool is None:
         init_connection_pool()
 
@@ -88,6 +118,7 @@ def get_db_connection():
             raise DatabaseError("Failed to get connection from pool")
         yield conn
         conn.commit()
+        _last_db_success = time.monotonic()
     except Exception as e:
         if conn:
             conn.rollback()
@@ -98,6 +129,38 @@ def get_db_connection():
             connection_pool.putconn(conn)
 
 
+@contextlib.contextmanager
+def advisory_lock(key: int):
+    """
+    Hold a session-level PostgreSQL advisory lock on a dedicated connection.
+    Blocks until the lock is free. PostgreSQL releases it automatically if
+    the process dies, so a crashed holder never leaves it stuck.
+
+    Args:
+        key: Lock identifier shared by every process that coordinates on it
+
+    Yields:
+        The autocommit connection holding the lock
+    """
+    try:
+        conn = psycopg2.connect(DATABASE_URL)
+        conn.autocommit = True
+    except Exception as e:
+        logger.error(f"Error opening advisory lock connection: {e}")
+        raise DatabaseError(f"Failed to open advisory lock connection: {e}")
+
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_lock(%s)", (key,))
+        yield conn
+    finally:
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_unlock(%s)", (key,))
+        finally:
+            conn.close()
+
+
 def execute_query(
     query: str,
     params: Optional[tuple] = None,
@@ -175,6 +238,23 @@ def get_user(telegram_id: int) -> Optional[Dict[str, Any]]:
     return execute_query(query, (telegram_id,), fetch_one=True)
 
 
+def is_user_banned(telegram_id: int) -> bool:
+    """Check whether a user is banned without loading the whole row."""
+    query = """
+        SELECT EXISTS (
+            SELECT 1 FROM users WHERE telegram_id = %s AND is_banned = TRUE
+        ) AS is_banned
+    """
+    result = execute_query(query, (telegram_id,), fetch_one=True)
+    return result["is_banned"] if result else False
+
+
+def get_user_by_stripe_customer_id(stripe_customer_id: str) -> Optional[Dict[str, Any]]:
+    """Get user by Stripe customer ID."""
+    query = "SELECT * FROM users WHERE stripe_customer_id = %s"
+    return execute_query(query, (stripe_customer_id,), fetch_one=True)
+
+
 def update_user_credits(
     telegram_id: int, credit_amount: int
 ) -> Optional[Dict[str, Any]]:
@@ -326,18 +406,25 @@ def log_transaction(
     time_granted_seconds: int = 0,
     status: str = "pending",
     description: Optional[str] = None,
+    transaction_id: Optional[str] = None,
 ) -> Dict[str, Any]:
-    """Log transaction for business intelligence."""
+    """
+    Log transaction for business intelligence.
+
+    transaction_id may be chosen by the caller so it can be referenced
+    (e.g. in Stripe metadata) before the row is written.
+    """
     query = """
         INSERT INTO transactions 
-        (user_id, product_id, stripe_charge_id, stripe_session_id, idempotency_key,
+        (id, user_id, product_id, stripe_charge_id, stripe_session_id, idempotency_key,
          amount_paid_usd_cents, credits_granted, time_granted_seconds, status, description, created_at)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
         RETURNING id, created_at;
     """
     return execute_query(
         query,
         (
+            transaction_id or str(uuid.uuid4()),
             user_id,
             product_id,
             stripe_charge_id,
@@ -373,6 +460,96 @@ def update_transaction_status(
         execute_query(query, (status, transaction_id))
 
 
+def complete_transaction_and_add_credits(
+    user_id: int,
+    transaction_id: str,
+    credits_granted: int = 0,
+    time_granted_seconds: int = 0,
+    auto_recharge_prompt_product_id: Optional[int] = None,
+) -> bool:
+    """
+    Mark a pending transaction completed and grant its credits/time.
+    Both updates run on one connection and commit together, so a failure
+    cannot leave a completed transaction without its credits (or vice versa).
+
+    Args:
+        user_id: User's Telegram ID
+        transaction_id: Transaction to complete
+        credits_granted: Message credits to add
+        time_granted_seconds: Seconds of time access to add
+        auto_recharge_prompt_product_id: If set, also store a pending
+            auto-recharge prompt for this product in the same transaction
+
+    Returns:
+        True if the transaction is now completed (including redeliveries
+        of an already completed transaction), False if no pending or
+        completed transaction with this ID exists
+    """
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            # Only a pending transaction may grant credits; this makes
+            # duplicate webhook deliveries a no-op
+            cursor.execute(
+                """
+                UPDATE transactions
+                SET status = 'completed'
+                WHERE id = %s AND status = 'pending'
+                RETURNING id
+                """,
+                (transaction_id,),
+            )
+            if cursor.fetchone() is None:
+                # Distinguish a redelivery from a transaction that was never
+                # recorded (or is failed/expired): only the former is done
+                cursor.execute(
+                    "SELECT status FROM transactions WHERE id = %s",
+                    (transaction_id,),
+                )
+                row = cursor.fetchone()
+                if row is not None and row["status"] == "completed":
+                    logger.info(f"Transaction {transaction_id} already processed")
+                    return True
+
+                status = row["status"] if row is not None else "missing"
+                logger.error(
+                    f"Cannot complete transaction {transaction_id} for user "
+                    f"{user_id}: status is {status}, no credits granted"
+                )
+                return False
+
+            cursor.execute(
+                """
+                UPDATE users
+                SET
+                    message_credits = message_credits + %s,
+                    time_credits_expires_at = CASE
+                        WHEN %s > 0 THEN GREATEST(
+                            COALESCE(time_credits_expires_at, NOW()), NOW()
+                        ) + make_interval(secs => %s)
+                        ELSE time_credits_expires_at
+                    END,
+                    updated_at = NOW()
+                WHERE telegram_id = %s
+                """,
+                (credits_granted, time_granted_seconds, time_granted_seconds, user_id),
+            )
+            if cursor.rowcount != 1:
+                # Rolls back the status update as well
+                raise DatabaseError(f"User {user_id} not found")
+
+            if auto_recharge_prompt_product_id is not None:
+                cursor.execute(
+                    _PENDING_AUTO_RECHARGE_PROMPT_UPSERT,
+                    (
+                        f"pending_auto_recharge_prompt_{user_id}",
+                        str(auto_recharge_prompt_product_id),
+                        f"Pending auto-recharge prompt for user {user_id}",
+                    ),
+                )
+
+    return True
+
+
 def get_user_transactions(user_id: int, limit: int = 10) -> List[Dict[str, Any]]:
     """
     Get user's transaction history.
@@ -678,10 +855,61 @@ def get_all_products() -> List[Dict[str, Any]]:
 # =============================================================================
 
 
-def apply_conversation_table_fix() -> None:
+def get_schema_version() -> int:
+    """
+    Get the schema version recorded by the last successful migration run.
+
+    Returns:
+        Recorded version, or 0 if migrations have never been recorded
+    """
+    try:
+        result = execute_query(
+            "SELECT value FROM migration_changes WHERE key = 'schema_version'",
+            fetch_one=True,
+        )
+    except DatabaseError:
+        # Table not created yet on databases that predate version tracking
+        return 0
+    return result["value"] if result else 0
+
+
+def set_schema_version(version: int) -> None:
+    """
+    Record the schema version after all migrations have been applied.
+
+    Args:
+        version: Schema version the code expects
+    """
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS migration_changes (
+                    key VARCHAR(50) PRIMARY KEY,
+                    value INTEGER NOT NULL,
+                    updated_at TIMESTAMPTZ DEFAULT NOW()
+                )
+                """
+            )
+            cursor.execute(
+                """
+                INSERT INTO migration_changes (key, value, updated_at)
+                VALUES ('schema_version', %s, NOW())
+                ON CONFLICT (key) DO UPDATE SET
+                    value = EXCLUDED.value,
+                    updated_at = NOW()
+                """,
+                (version,),
+            )
+
+
+def apply_conversation_table_fix() -> bool:
     """
     Apply critical fix for conversations table constraint issue.
     This addresses the ON CONFLICT deferrable constraint problem.
+
+    Returns:
+        True if the migration applied cleanly, False if it failed
     """
     try:
         logger.info("🔧 Applying conversations table constraint fix...")
@@ -731,16 +959,21 @@ def apply_conversation_table_fix() -> None:
             logger.warning(f"Could not clean up duplicates: {e}")
 
         logger.info("✅ Conversations table constraint fix completed")
+        return True
 
     except Exception as e:
         logger.error(f"Failed to apply conversations table fix: {e}")
         # Don't raise - this is a migration, let the app continue
+        return False
 
 
-def fix_products_table_schema() -> None:
+def fix_products_table_schema() -> bool:
     """
     Ensure the products table has all required columns.
     This fixes schema mismatches from earlier deployments.
+
+    Returns:
+        True if every required column is present, False otherwise
     """
     try:
         logger.info("🔧 Checking and fixing products table schema...")
@@ -772,6 +1005,7 @@ def fix_products_table_schema() -> None:
         }
 
         # Add missing columns
+        columns_ok = True
         for column_name, column_def in required_columns.items():
             if column_name not in column_names:
                 try:
@@ -782,6 +1016,7 @@ def fix_products_table_schema() -> None:
                     logger.info(f"✅ Added column: {column_name}")
                 except Exception as e:
                     logger.error(f"Failed to add column {column_name}: {e}")
+                    columns_ok = False
 
         # Ensure we have a unique constraint on stripe_price_id
         try:
@@ -799,21 +1034,27 @@ def fix_products_table_schema() -> None:
                 logger.warning(f"Could not add stripe_price_id constraint: {e}")
 
         logger.info("✅ Products table schema check completed")
+        return columns_ok
 
     except Exception as e:
         logger.error(f"Failed to fix products table schema: {e}")
+        return False
 
 
-def ensure_sample_products() -> None:
+def ensure_sample_products() -> bool:
     """
     Ensure sample products exist in database for testing.
     Call this during app startup if no products found.
+
+    Returns:
+        True if the migration applied cleanly, False if it failed
     """
     try:
         # First fix the schema
         logger.info("🔧 Fixing products table schema...")
-        fix_products_table_schema()
-        logger.info("✅ Products table schema fixed")
+        schema_fixed = fix_products_table_schema()
+        if schema_fixed:
+            logger.info("✅ Products table schema fixed")
 
         # Check if products already exist
         existing_products = get_active_products()
@@ -826,7 +1067,7 @@ def ensure_sample_products() -> None:
             # Log existing products for verification
             for product in existing_products:
                 logger.info(f"  • {product['name']} - ${product['price_usd_cents']/100:.2f}")
-            return
+            return schema_fixed
 
         logger.info("📦 No products found, creating sample products...")
 
@@ -903,20 +1144,26 @@ def ensure_sample_products() -> None:
         
         if len(final_products) == 0:
             logger.error("❌ No products found after creation attempt!")
+            return False
         else:
             logger.info(f"🎉 Successfully ensured {len(final_products)} products exist")
             for product in final_products:
                 logger.info(f"  • {product['name']} - ${product['price_usd_cents']/100:.2f}")
+        return schema_fixed
 
     except Exception as e:
         logger.error(f"❌ Failed to ensure sample products: {e}")
         # Don't raise - this shouldn't crash the app startup
+        return False
 
 
-def apply_database_views_and_functions() -> None:
+def apply_database_views_and_functions() -> bool:
     """
     Apply database views and functions that are missing from initial deployment.
     This ensures the user_dashboard_view and other schema objects are created.
+
+    Returns:
+        True if the migration applied cleanly, False if it failed
     """
     try:
         logger.info("🔧 Applying database views and functions...")
@@ -1017,16 +1264,21 @@ def apply_database_views_and_functions() -> None:
         logger.info("✅ Created/updated set_bot_setting function")
 
         logger.info("✅ Database views and functions applied successfully")
+        return True
 
     except Exception as e:
         logger.error(f"Failed to apply database views and functions: {e}")
         # Don't raise - this is a migration, let the app continue
+        return False
 
 
-def apply_enhanced_ux_migration() -> None:
+def apply_enhanced_ux_migration() -> bool:
     """
     Apply database migration for enhanced UX features.
     Adds new columns and bot settings for tutorial, progress bars, and quick buy.
+
+    Returns:
+        True if the migration applied cleanly, False if it failed
     """
     logger.info("🔧 Applying enhanced UX migration...")
 
@@ -1253,10 +1505,12 @@ def apply_enhanced_ux_migration() -> None:
                 # STEP 5: Commit all changes
                 conn.commit()
                 logger.info("✅ Enhanced UX migration completed successfully")
+        return True
 
     except Exception as e:
         logger.error(f"❌ Enhanced UX migration failed: {e}")
         # Don't raise - let the app continue with whatever state it's in
+        return False
 
 
 # =============================================================================
@@ -2131,7 +2385,7 @@ def gift_credits_to_user(telegram_id: int, credits: int, gifted_by: int) -> bool
             VALUES (%s, NULL, NULL, NULL, %s, 0, %s, 0, 'completed', %s, NOW())
         """
 
-        idempotency_key = str(uuid.uuid4())
+        idempotency_key = secrets.token_hex(16)
         description = f"Admin gift: {credits} credits (gifted by admin {gifted_by})"
 
         execute_query(query, (telegram_id, idempotency_key, credits, description))
@@ -2171,6 +2425,7 @@ def ban_user(telegram_id: int, banned_by: int, reason: str = "Admin decision") -
         """
 
         execute_query(query, (banned_by, reason, telegram_id))
+        invalidate_user_cache(telegram_id)
 
         # Archive any active conversations
         archive_conversation(telegram_id, -1, f"User banned: {reason}")
@@ -2209,6 +2464,7 @@ def unban_user(telegram_id: int, unbanned_by: int) -> bool:
         """
 
         execute_query(query, (telegram_id,))
+        invalidate_user_cache(telegram_id)
 
         logger.info(f"✅ Unbanned user {telegram_id} by admin {unbanned_by}")
         return True
@@ -2218,12 +2474,12 @@ def unban_user(telegram_id: int, unbanned_by: int) -> bool:
         return False
 
 
-# Import uuid for idempotency keys
-
-
-def apply_unread_tracking_migration() -> None:
+def apply_unread_tracking_migration() -> bool:
     """
     Add unread message tracking columns to conversations table.
+
+    Returns:
+        True if the migration applied cleanly, False if it failed
     """
     try:
         logger.info("🔧 Applying unread tracking migration...")
@@ -2255,12 +2511,14 @@ def apply_unread_tracking_migration() -> None:
             )
 
         # Execute migrations
+        applied_cleanly = True
         for migration in migrations:
             try:
                 execute_query(migration)
                 logger.info(f"✅ Executed: {migration}")
             except Exception as e:
                 logger.error(f"Failed to execute {migration}: {e}")
+                applied_cleanly = False
 
         # Add index for performance
         index_query = """
@@ -2275,10 +2533,12 @@ def apply_unread_tracking_migration() -> None:
             logger.warning(f"Could not add index: {e}")
 
         logger.info("✅ Unread tracking migration completed")
+        return applied_cleanly
 
     except Exception as e:
         logger.error(f"Failed to apply unread tracking migration: {e}")
         # Don't raise - this is a migration, let the app continue
+        return False
 
 
 # =============================================================================
@@ -2331,10 +2591,13 @@ def get_banned_user_count() -> int:
     return result["count"] if result else 0
 
 
-def apply_conversations_updated_at_fix() -> None:
+def apply_conversations_updated_at_fix() -> bool:
     """
     Add the missing updated_at column to conversations table.
     This fixes the error: column "updated_at" of relation "conversations" does not exist
+
+    Returns:
+        True if the migration applied cleanly, False if it failed
     """
     try:
         logger.info("🔧 Adding missing updated_at column to conversations table...")
@@ -2350,7 +2613,7 @@ def apply_conversations_updated_at_fix() -> None:
 
         if existing_column:
             logger.info("✅ updated_at column already exists in conversations table")
-            return
+            return True
 
         # Add the missing column
         add_column_query = """
@@ -2380,10 +2643,12 @@ def apply_conversations_updated_at_fix() -> None:
         logger.info("✅ Created trigger for automatic timestamp updates")
 
         logger.info("✅ Conversations updated_at column fix completed")
+        return True
 
     except Exception as e:
         logger.error(f"Failed to add updated_at column to conversations: {e}")
         # Don't raise - this is a migration, let the app continue
+        return False
 
 
 # =============================================================================
@@ -2391,6 +2656,16 @@ def apply_conversations_updated_at_fix() -> None:
 # =============================================================================
 
 
+_PENDING_AUTO_RECHARGE_PROMPT_UPSERT = """
+    INSERT INTO bot_settings (key, value, description, updated_at)
+    VALUES (%s, %s, %s, NOW())
+    ON CONFLICT (key) 
+    DO UPDATE SET 
+        value = EXCLUDED.value,
+        updated_at = EXCLUDED.updated_at
+"""
+
+
 def store_pending_auto_recharge_prompt(user_id: int, product_id: int) -> None:
     """
     Store a pending auto-recharge prompt for a user.
@@ -2400,15 +2675,8 @@ def store_pending_auto_recharge_prompt(user_id: int, product_id: int) -> None:
         user_id: User's Telegram ID
         product_id: Product ID for auto-recharge setup
     """
-    query = """
-        INSERT INTO bot_settings (key, value, description, updated_at)
-        VALUES (%s, %s, %s, NOW())
-        ON CONFLICT (key) 
-        DO UPDATE SET 
-            value = EXCLUDED.value,
-            updated_at = EXCLUDED.updated_at
-    """
-    
+    query = _PENDING_AUTO_RECHARGE_PROMPT_UPSERT
+
     key = f"pending_auto_recharge_prompt_{user_id}"
     value = str(product_id)
     description = f"Pending auto-recharge prompt for user {user_id}"
@@ -2445,6 +2713,159 @@ def get_pending_auto_recharge_prompt(user_id: int) -> Optional[int]:
     
     return None
 
+# =============================================================================
+# WEBHOOK EVENT QUEUE
+# =============================================================================
+
+
+def enqueue_webhook_event(event_id: str, event_type: str, payload: str) -> bool:
+    """
+    Persist a verified webhook event for background processing.
+
+    Args:
+        event_id: Stripe event ID
+        event_type: Stripe event type
+        payload: Raw JSON event body
+
+    Returns:
+        True if the event was queued, False if it was already known
+    """
+    query = """
+        INSERT INTO webhook_events (event_id, event_type, payload)
+        VALUES (%s, %s, %s::jsonb)
+        ON CONFLICT (event_id) DO NOTHING
+    """
+    return execute_query(query, (event_id, event_type, payload)) == 1
+
+
+def claim_webhook_events(
+    limit: int = 20, stale_after_seconds: int = 300
+) -> List[Dict[str, Any]]:
+    """
+    Claim pending webhook events for processing.
+
+    Rows are locked with SKIP LOCKED, so several workers can drain the
+    queue without taking the same event. Events left 'processing' by a
+    worker that died are reclaimed once stale.
+
+    Args:
+        limit: Maximum number of events to claim
+        stale_after_seconds: Age after which a 'processing' claim expires
+
+    Returns:
+        Claimed events with id, event_id, attempts and parsed payload
+    """
+    query = """
+        UPDATE webhook_events
+        SET status = 'processing', attempts = attempts + 1, locked_at = NOW()
+        WHERE id IN (
+            SELECT id FROM webhook_events
+            WHERE (status = 'pending'
+                   AND (next_attempt_at IS NULL OR next_attempt_at <= NOW()))
+               OR (status = 'processing'
+                   AND locked_at < NOW() - make_interval(secs => %s))
+            ORDER BY id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id, event_id, attempts, payload
+    """
+    result = execute_query(query, (stale_after_seconds, limit), fetch_all=True)
+    return sorted(result, key=lambda row: row["id"]) if result else []
+
+
+def finish_webhook_event(
+    queue_id: int,
+    success: bool,
+    attempts: int,
+    max_attempts: int = 5,
+    retry_base_seconds: int = 60,
+) -> str:
+    """
+    Record the outcome of processing a claimed webhook event.
+
+    Failed events are retried with exponential backoff (1, 4, 16, 64
+    minutes with the defaults), since Stripe has already been acknowledged
+    and will not redeliver them.
+
+    Args:
+        queue_id: webhook_events row ID
+        success: Whether the handler succeeded
+        attempts: Attempts made so far, including this one
+        max_attempts: Attempts after which a failing event is given up on
+        retry_base_seconds: Delay before the first retry
+
+    Returns:
+        New status of the event: 'done', 'pending' or 'failed'
+    """
+    if success:
+        status = "done"
+    elif attempts >= max_attempts:
+        status = "failed"
+    else:
+        status = "pending"
+
+    retry_delay = retry_base_seconds * 4 ** (attempts - 1)
+    query = """
+        UPDATE webhook_events
+        SET status = %s, locked_at = NULL,
+            next_attempt_at = CASE WHEN %s = 'pending'
+                THEN NOW() + make_interval(secs => %s) ELSE NULL END,
+            processed_at = CASE WHEN %s = 'done' THEN NOW() ELSE processed_at END
+        WHERE id = %s
+    """
+    execute_query(query, (status, status, retry_delay, status, queue_id))
+    return status
+
+
+def apply_webhook_events_migration() -> bool:
+    """
+    Create the webhook_events queue table if it doesn't exist.
+
+    Returns:
+        True if the migration applied cleanly, False if it failed
+    """
+    try:
+        logger.info("🔧 Applying webhook_events table migration...")
+
+        execute_query(
+            """
+            CREATE TABLE IF NOT EXISTS webhook_events (
+                id BIGSERIAL PRIMARY KEY,
+                event_id VARCHAR(255) NOT NULL UNIQUE,
+                event_type VARCHAR(100) NOT NULL,
+                payload JSONB NOT NULL,
+                status VARCHAR(20) NOT NULL DEFAULT 'pending',
+                attempts INT NOT NULL DEFAULT 0,
+                locked_at TIMESTAMPTZ,
+                next_attempt_at TIMESTAMPTZ,
+                created_at TIMESTAMPTZ DEFAULT NOW(),
+                processed_at TIMESTAMPTZ
+            )
+            """
+        )
+        # Tables created before retry backoff existed
+        execute_query(
+            """
+            ALTER TABLE webhook_events
+            ADD COLUMN IF NOT EXISTS next_attempt_at TIMESTAMPTZ
+            """
+        )
+        execute_query(
+            """
+            CREATE INDEX IF NOT EXISTS idx_webhook_events_pending
+            ON webhook_events (id) WHERE status IN ('pending', 'processing')
+            """
+        )
+        logger.info("✅ Webhook events table created successfully")
+        return True
+
+    except Exception as e:
+        logger.error(f"Failed to apply webhook_events migration: {e}")
+        # Don't raise - this is a migration, let the app continue
+        return False
+
+
 # Add new migration function before the end of the file
 def apply_performance_indexes_migration() -> None:
     """
@@ -2835,10 +3256,13 @@ def get_optimized_conversation_list(admin_group_id: int, limit: int = 50) -> Lis
     return execute_query(query, (admin_group_id, limit), fetch_all=True)
 
 # Add new migration function before the end of the file
-def clean_problematic_indexes() -> None:
+def clean_problematic_indexes() -> bool:
     """
     Clean up any problematic indexes that might be causing CONCURRENTLY errors.
     This function removes any incomplete or problematic index creation attempts.
+
+    Returns:
+        True if the migration applied cleanly, False if it failed
     """
     try:
         logger.info("🧹 Cleaning up problematic indexes...")
@@ -2871,18 +3295,23 @@ def clean_problematic_indexes() -> None:
                 # Continue with other indexes
         
         logger.info(f"✅ Force-cleaned {cleaned_count} indexes")
+        return True
         
     except Exception as e:
         logger.warning(f"Index cleanup failed: {e}")
         # Don't raise - this is cleanup, not critical
+        return False
 
 
 
-def apply_performance_indexes_migration() -> None:
+def apply_performance_indexes_migration() -> bool:
     """
     Apply critical performance indexes that are missing.
     These indexes improve query performance for high-traffic scenarios.
     NOTE: Indexes are created WITHOUT CONCURRENTLY to avoid transaction block issues.
+
+    Returns:
+        True if the migration applied cleanly, False if it failed
     """
     try:
         logger.info("🔧 Applying performance indexes migration...")
@@ -2930,15 +3359,20 @@ def apply_performance_indexes_migration() -> None:
             f"✅ Performance indexes migration completed: "
             f"{successful_indexes} successful, {failed_indexes} failed"
         )
+        return failed_indexes == 0
 
     except Exception as e:
         logger.error(f"Failed to apply performance indexes migration: {e}")
         # Don't raise - this is a migration, let the app continue
+        return False
 
 
-def apply_message_references_table_migration() -> None:
+def apply_message_references_table_migration() -> bool:
     """
     Create message_references table if it doesn't exist.
+
+    Returns:
+        True if the migration applied cleanly, False if it failed
     """
     try:
         logger.info("🔧 Applying message_references table migration...")
@@ -2957,8 +3391,10 @@ def apply_message_references_table_migration() -> None:
         
         execute_query(create_table_query)
         logger.info("✅ Message references table created successfully")
+        return True
 
     except Exception as e:
         logger.error(f"Failed to apply message_references migration: {e}")
         # Don't raise - this is a migration, let the app continue
+        return False
 
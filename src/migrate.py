@@ -0,0 +1,161 @@
+"""
+Enterprise Telegram Bot - Database Migration Runner
+
+This module applies database migrations once per schema version. It runs as a
+release-phase job (python -m src.migrate) before workers start, and workers
+call it on boot as a cheap version check in case the release step was skipped.
+"""
+
+import contextlib
+import logging
+import sys
+
+from src import database as db
+
+logger = logging.getLogger(__name__)
+
+# Advisory lock key shared by every process that runs migrations
+MIGRATION_LOCK_KEY = 0x7E1E6B07
+
+# Bump whenever a step in _apply_migrations is added or changed
+SCHEMA_VERSION = 11
+
+_migrations_completed = False
+
+
+def _apply_migrations() -> bool:
+    """
+    Apply every database migration in order. Each step is idempotent and
+    logs its own errors instead of raising, so later steps still run.
+
+    Returns:
+        True if every step applied cleanly
+    """
+    logger.info("🔧 Running database migrations (process-safe)...")
+    failed_steps = []
+
+    # Apply database migrations with better error handling
+    logger.info("📝 Applying conversation table fix...")
+    if not db.apply_conversation_table_fix():
+        failed_steps.append("apply_conversation_table_fix")
+
+    # Apply enhanced UX migration
+    logger.info("📝 Applying enhanced UX migration...")
+    if not db.apply_enhanced_ux_migration():
+        failed_steps.append("apply_enhanced_ux_migration")
+
+    # Apply unread tracking migration
+    logger.info("📝 Applying unread tracking migration...")
+    if not db.apply_unread_tracking_migration():
+        failed_steps.append("apply_unread_tracking_migration")
+
+    # Apply conversations updated_at fix
+    logger.info("📝 Applying conversations updated_at fix...")
+    if not db.apply_conversations_updated_at_fix():
+        failed_steps.append("apply_conversations_updated_at_fix")
+
+    # Apply database views and functions
+    logger.info("📝 Applying database views and functions...")
+    if not db.apply_database_views_and_functions():
+        failed_steps.append("apply_database_views_and_functions")
+
+    # Clean up any problematic indexes first
+    logger.info("📝 Cleaning problematic indexes...")
+    if not db.clean_problematic_indexes():
+        failed_steps.append("clean_problematic_indexes")
+
+    # Apply performance indexes migration
+    logger.info("📝 Applying performance indexes migration...")
+    if not db.apply_performance_indexes_migration():
+        failed_steps.append("apply_performance_indexes_migration")
+
+    # Apply message references table migration
+    logger.info("📝 Applying message references table migration...")
+    if not db.apply_message_references_table_migration():
+        failed_steps.append("apply_message_references_table_migration")
+
+    # Apply Stripe webhook event queue migration
+    logger.info("📝 Applying webhook events migration...")
+    if not db.apply_webhook_events_migration():
+        failed_steps.append("apply_webhook_events_migration")
+
+    # Fix the products schema and seed sample products on empty databases
+    logger.info("📝 Ensuring sample products exist...")
+    if not db.ensure_sample_products():
+        failed_steps.append("ensure_sample_products")
+
+    if failed_steps:
+        logger.error(f"❌ Migration steps failed: {', '.join(failed_steps)}")
+        return False
+    return True
+
+
+def run_migrations_once() -> bool:
+    """
+    Run database migrations only once, even with multiple Gunicorn workers.
+    Warm databases already at SCHEMA_VERSION are skipped with one query.
+    Otherwise workers serialize on a PostgreSQL advisory lock; the first one
+    applies the migrations and records the version, the rest wait and skip.
+
+    Returns:
+        True if the schema is current, False if a migration step failed
+    """
+    global _migrations_completed
+
+    if _migrations_completed:
+        logger.info("📋 Migrations already completed by this worker")
+        return True
+
+    if db.get_schema_version() >= SCHEMA_VERSION:
+        logger.info("📋 Database schema is current (version %s)", SCHEMA_VERSION)
+        _migrations_completed = True
+        return True
+
+    with contextlib.ExitStack() as stack:
+        try:
+            stack.enter_context(db.advisory_lock(MIGRATION_LOCK_KEY))
+            locked = True
+        except db.DatabaseError as lock_error:
+            # Continue anyway, but with caution
+            logger.warning(f"Could not acquire migration lock: {lock_error}")
+            locked = False
+
+        if locked and db.get_schema_version() >= SCHEMA_VERSION:
+            logger.info("📋 Migrations already completed by another worker")
+            _migrations_completed = True
+            return True
+
+        if not _apply_migrations():
+            # Leave the version unrecorded so the next start retries
+            return False
+        db.set_schema_version(SCHEMA_VERSION)
+
+    _migrations_completed = True
+    logger.info("✅ All database migrations completed successfully")
+    return True
+
+
+def main() -> int:
+    """
+    Release-phase entry point: migrate the database and exit.
+
+    Returns:
+        Process exit code
+    """
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+    )
+    try:
+        db.init_connection_pool()
+        if not run_migrations_once():
+            return 1
+    except Exception as e:
+        logger.error(f"❌ Migration failed: {e}")
+        return 1
+    finally:
+        db.close_connection_pool()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
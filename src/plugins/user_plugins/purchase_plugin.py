@@ -5,6 +5,7 @@ This plugin handles all user-facing purchase functionality including
 product catalog, checkout flow, Stripe integration, and billing management.
 """
 
+import asyncio
 import logging
 
 from telegram import (
@@ -23,6 +24,7 @@ from telegram.ext import (
 from src.plugins.base_plugin import BasePlugin
 from src import database as db
 from src import stripe_utils
+from src.cache import has_user_made_purchases_cached
 from src.services.error_service import ErrorService, ErrorType
 
 logger = logging.getLogger(__name__)
@@ -168,12 +170,27 @@ class PurchasePlugin(BasePlugin):
             )
             await edit_or_reply(text, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN)
 
+            # Create the Stripe customer while the user browses, so the
+            # checkout click doesn't wait on it
+            if keyboard:
+                context.application.create_task(
+                    self._prepare_stripe_customer(update.effective_user.id)
+                )
+
         except Exception as e:
             logger.error(f"Error in show_products_callback: {e}")
             await ErrorService.handle_error(
                 update, context, ErrorType.SYSTEM_ERROR, e, "Error loading products."
             )
 
+    async def _prepare_stripe_customer(self, user_id: int) -> None:
+        """Ensure the user has a Stripe customer without blocking handlers."""
+        try:
+            await asyncio.to_thread(stripe_utils.ensure_stripe_customer, user_id)
+        except Exception as e:
+            # Checkout creates the customer itself if this didn't succeed
+            logger.warning(f"Could not prepare Stripe customer for {user_id}: {e}")
+
     async def billing_command(
         self, update: Update, context: ContextTypes.DEFAULT_TYPE
     ) -> None:
@@ -256,7 +273,7 @@ class PurchasePlugin(BasePlugin):
 
             user_data = db.get_user(user.id)
             has_payment_method = bool(user_data.get("stripe_customer_id"))
-            is_first_purchase = not db.has_user_made_purchases(user.id)
+            is_first_purchase = not has_user_made_purchases_cached(user.id)
 
             checkout_url = stripe_utils.create_checkout_session(
                 user.id, product["stripe_price_id"]
@@ -14,6 +14,20 @@ from src import database as db
 
 logger = logging.getLogger(__name__)
 
+# Tutorial keyboards are static; PTB objects are immutable, so build them once
+_STEP_1_MARKUP = InlineKeyboardMarkup(
+    [[InlineKeyboardButton("Check My Balance", callback_data="tutorial_step_2")]]
+)
+_STEP_2_MARKUP = InlineKeyboardMarkup(
+    [[InlineKeyboardButton("How It Works", callback_data="tutorial_step_3")]]
+)
+_STEP_3_MARKUP = InlineKeyboardMarkup(
+    [[InlineKeyboardButton("✅ Finish Tutorial", callback_data="complete_tutorial")]]
+)
+_COMPLETE_MARKUP = InlineKeyboardMarkup(
+    [[InlineKeyboardButton("Start Chatting Now!", callback_data="start_chatting")]]
+)
+
 
 class TutorialPlugin(BasePlugin):
     """Plugin for the new user interactive tutorial."""
@@ -34,32 +48,33 @@ class TutorialPlugin(BasePlugin):
 
     def register_handlers(self, application: Application) -> None:
         """Register all tutorial handlers."""
+        self._step_handlers = {
+            "start_tutorial": self.start_tutorial_callback,
+            "tutorial_step_2": self.tutorial_step_2_callback,
+            "tutorial_step_3": self.tutorial_step_3_callback,
+            "complete_tutorial": self.complete_tutorial_callback,
+            "start_chatting": self.start_chatting_callback,
+        }
+
+        # One handler for every tutorial step: PTB matches a single
+        # alternation regex per callback query instead of five.
         application.add_handler(
             CallbackQueryHandler(
-                self.start_tutorial_callback, pattern="^start_tutorial$"
-            )
-        )
-        application.add_handler(
-            CallbackQueryHandler(
-                self.tutorial_step_2_callback, pattern="^tutorial_step_2$"
-            )
-        )
-        application.add_handler(
-            CallbackQueryHandler(
-                self.tutorial_step_3_callback, pattern="^tutorial_step_3$"
-            )
-        )
-        application.add_handler(
-            CallbackQueryHandler(
-                self.complete_tutorial_callback, pattern="^complete_tutorial$"
-            )
-        )
-        application.add_handler(
-            CallbackQueryHandler(
-                self.start_chatting_callback, pattern="^start_chatting$"
+                self._dispatch_callback,
+                pattern=(
+                    "^(start_tutorial|tutorial_step_2|tutorial_step_3"
+                    "|complete_tutorial|start_chatting)$"
+                ),
+                block=False,
             )
         )
 
+    async def _dispatch_callback(
+        self, update: Update, context: ContextTypes.DEFAULT_TYPE
+    ) -> None:
+        """Route a tutorial callback query to the handler for its step."""
+        await self._step_handlers[update.callback_query.data](update, context)
+
     def get_commands(self) -> Dict[str, str]:
         """Get commands provided by this plugin."""
         return {}
@@ -85,12 +100,7 @@ Your account balance is where you can see how many message credits you have.
 Check your balance now to see your starting credits!
         """
 
-        keyboard = [
-            [InlineKeyboardButton("Check My Balance", callback_data="tutorial_step_2")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-
-        await query.edit_message_text(text, reply_markup=reply_markup)
+        await query.edit_message_text(text, reply_markup=_STEP_1_MARKUP)
 
     async def tutorial_step_2_callback(
         self, update: Update, context: ContextTypes.DEFAULT_TYPE
@@ -115,12 +125,7 @@ To start a conversation, simply send a message in this chat. Our team will get b
 Try sending a message now!
         """
 
-        keyboard = [
-            [InlineKeyboardButton("How It Works", callback_data="tutorial_step_3")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-
-        await query.edit_message_text(text, reply_markup=reply_markup)
+        await query.edit_message_text(text, reply_markup=_STEP_2_MARKUP)
 
     async def tutorial_step_3_callback(
         self, update: Update, context: ContextTypes.DEFAULT_TYPE
@@ -144,16 +149,7 @@ When you send a message, we create a private topic for you in our admin group.
 Ready to get started?
         """
 
-        keyboard = [
-            [
-                InlineKeyboardButton(
-                    "✅ Finish Tutorial", callback_data="complete_tutorial"
-                )
-            ]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-
-        await query.edit_message_text(text, reply_markup=reply_markup)
+        await query.edit_message_text(text, reply_markup=_STEP_3_MARKUP)
 
     async def complete_tutorial_callback(
         self, update: Update, context: ContextTypes.DEFAULT_TYPE
@@ -177,16 +173,7 @@ You're all set to use the bot. Here are some quick tips:
 Start chatting now!
         """
 
-        keyboard = [
-            [
-                InlineKeyboardButton(
-                    "Start Chatting Now!", callback_data="start_chatting"
-                )
-            ]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-
-        await query.edit_message_text(text, reply_markup=reply_markup)
+        await query.edit_message_text(text, reply_markup=_COMPLETE_MARKUP)
 
     async def start_chatting_callback(
         self, update: Update, context: ContextTypes.DEFAULT_TYPE
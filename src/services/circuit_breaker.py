@@ -6,11 +6,11 @@ to handle failures gracefully and prevent cascading failures.
 """
 
 import asyncio
+import inspect
 import logging
 import time
 from enum import Enum
 from typing import Any, Callable, Dict
-from dataclasses import dataclass
 
 logger = logging.getLogger(__name__)
 
@@ -22,13 +22,34 @@ class CircuitState(Enum):
     HALF_OPEN = "half_open"  # Testing if service recovered
 
 
-@dataclass
 class CircuitBreakerConfig:
     """Configuration for circuit breaker."""
-    failure_threshold: int = 5      # Failures before opening
-    recovery_timeout: int = 60      # Seconds before trying half-open
-    success_threshold: int = 3      # Successes to close from half-open
-    timeout: int = 30               # Request timeout in seconds
+
+    __slots__ = (
+        "failure_threshold",
+        "recovery_timeout",
+        "success_threshold",
+        "timeout",
+    )
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,     # Failures before opening
+        recovery_timeout: int = 60,     # Seconds before trying half-open
+        success_threshold: int = 3,     # Successes to close from half-open
+        timeout: int = 30,              # Request timeout in seconds
+    ):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.success_threshold = success_threshold
+        self.timeout = timeout
+
+    def __repr__(self) -> str:
+        return (
+            f"CircuitBreakerConfig(failure_threshold={self.failure_threshold}, "
+            f"recovery_timeout={self.recovery_timeout}, "
+            f"success_threshold={self.success_threshold}, timeout={self.timeout})"
+        )
 
 
 class CircuitBreakerError(Exception):
@@ -85,7 +106,7 @@ class CircuitBreaker:
                 self.success_count = 0
                 logger.info(f"Circuit breaker '{self.name}' closed - service recovered")
         
-        logger.debug(f"Circuit breaker '{self.name}' recorded success")
+        logger.debug("Circuit breaker '%s' recorded success", self.name)
 
     def _record_failure(self) -> None:
         """Record a failed call."""
@@ -104,7 +125,7 @@ class CircuitBreaker:
             self.state = CircuitState.OPEN
             logger.warning(f"Circuit breaker '{self.name}' reopened - test call failed")
         
-        logger.debug(f"Circuit breaker '{self.name}' recorded failure")
+        logger.debug("Circuit breaker '%s' recorded failure", self.name)
 
     async def call(self, func: Callable, *args, **kwargs) -> Any:
         """
@@ -134,14 +155,11 @@ class CircuitBreaker:
             )
 
         try:
-            # Execute function with timeout
-            if asyncio.iscoroutinefunction(func):
-                result = await asyncio.wait_for(
-                    func(*args, **kwargs), 
-                    timeout=self.config.timeout
-                )
-            else:
-                result = func(*args, **kwargs)
+            # Execute function; apply the timeout to whatever it returns that
+            # can be awaited (covers partials and other wrapped coroutines)
+            result = func(*args, **kwargs)
+            if inspect.isawaitable(result):
+                result = await asyncio.wait_for(result, timeout=self.config.timeout)
             
             self._record_success()
             return result
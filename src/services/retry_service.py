@@ -6,11 +6,12 @@ for handling transient failures in external API calls and database operations.
 """
 
 import asyncio
+import functools
 import logging
 import random
 import time
 from typing import Any, Callable, Dict, List, Optional, Type, Union
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from enum import Enum
 
 logger = logging.getLogger(__name__)
@@ -23,7 +24,7 @@ class RetryStrategy(Enum):
     FIXED_DELAY = "fixed_delay"
 
 
-@dataclass
+@dataclass(frozen=True)
 class RetryConfig:
     """Configuration for retry behavior."""
     max_attempts: int = 3
@@ -33,6 +34,30 @@ class RetryConfig:
     jitter: bool = True
     exponential_base: float = 2.0
     retryable_exceptions: tuple = (Exception,)
+    # Optional server-provided wait (e.g. Retry-After) that overrides backoff
+    delay_hint_fn: Optional[Callable[[Exception], Optional[float]]] = None
+    # Derived in __post_init__: capped, un-jittered delay per attempt and the
+    # exact retryable types for a set lookup before falling back to isinstance
+    base_delays: tuple = field(init=False, repr=False, compare=False)
+    retryable_types: frozenset = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        if self.strategy == RetryStrategy.EXPONENTIAL_BACKOFF:
+            delays = (
+                self.base_delay * (self.exponential_base ** i)
+                for i in range(self.max_attempts)
+            )
+        elif self.strategy == RetryStrategy.LINEAR_BACKOFF:
+            delays = (self.base_delay * (i + 1) for i in range(self.max_attempts))
+        else:  # FIXED_DELAY
+            delays = (self.base_delay for _ in range(self.max_attempts))
+
+        object.__setattr__(
+            self, "base_delays", tuple(min(d, self.max_delay) for d in delays)
+        )
+        object.__setattr__(
+            self, "retryable_types", frozenset(self.retryable_exceptions)
+        )
 
 
 class RetryError(Exception):
@@ -73,26 +98,32 @@ class RetryService:
         Returns:
             Delay in seconds
         """
-        if self.config.strategy == RetryStrategy.EXPONENTIAL_BACKOFF:
-            delay = self.config.base_delay * (
-                self.config.exponential_base ** (attempt - 1)
-            )
-        elif self.config.strategy == RetryStrategy.LINEAR_BACKOFF:
-            delay = self.config.base_delay * attempt
-        else:  # FIXED_DELAY
-            delay = self.config.base_delay
-
-        # Apply maximum delay limit
-        delay = min(delay, self.config.max_delay)
+        delay = self.config.base_delays[attempt - 1]
 
-        # Add jitter if enabled (±25% random variation)
+        # Full jitter: pick uniformly in [0, delay) to decorrelate retry storms
         if self.config.jitter:
-            jitter_amount = delay * 0.25
-            delay += random.uniform(-jitter_amount, jitter_amount)
-            delay = max(0, delay)  # Ensure non-negative delay
+            return delay * random.random()
 
         return delay
 
+    def _get_retry_delay(self, attempt: int, exception: Exception) -> float:
+        """
+        Get delay before retrying, preferring a server-provided hint.
+
+        Args:
+            attempt: Attempt number that just failed (1-based)
+            exception: Exception raised by that attempt
+
+        Returns:
+            Delay in seconds
+        """
+        if self.config.delay_hint_fn is not None:
+            hint = self.config.delay_hint_fn(exception)
+            if hint is not None:
+                return min(hint, self.config.max_delay)
+
+        return self._calculate_delay(attempt)
+
     def _is_retryable_exception(self, exception: Exception) -> bool:
         """
         Check if exception is retryable based on configuration.
@@ -103,7 +134,11 @@ class RetryService:
         Returns:
             True if exception should trigger retry
         """
-        return isinstance(exception, self.config.retryable_exceptions)
+        # Most raised exceptions are exactly a listed type; subclasses
+        # (e.g. ConnectionError under OSError) still need isinstance
+        return type(exception) in self.config.retryable_types or isinstance(
+            exception, self.config.retryable_exceptions
+        )
 
     async def execute_async(
         self, 
@@ -125,41 +160,43 @@ class RetryService:
         Raises:
             RetryError: When all attempts are exhausted
         """
-        last_exception = None
-        
-        for attempt in range(1, self.config.max_attempts + 1):
+        # Fast path: most calls succeed on the first attempt
+        try:
+            return await func(*args, **kwargs)
+        except Exception as e:
+            if not self._is_retryable_exception(e):
+                logger.debug("Non-retryable exception: %s", type(e).__name__)
+                raise
+            last_exception = e
+
+        for attempt in range(2, self.config.max_attempts + 1):
+            delay = self._get_retry_delay(attempt - 1, last_exception)
+            logger.warning(
+                "Attempt %d failed with %s: %s. Retrying in %.2fs",
+                attempt - 1,
+                type(last_exception).__name__,
+                last_exception,
+                delay,
+            )
+            await asyncio.sleep(delay)
+
             try:
-                logger.debug(f"Retry attempt {attempt}/{self.config.max_attempts}")
+                logger.debug("Retry attempt %d/%d", attempt, self.config.max_attempts)
                 result = await func(*args, **kwargs)
-                
-                if attempt > 1:
-                    logger.info(f"Function succeeded on attempt {attempt}")
-                
+                logger.info("Function succeeded on attempt %d", attempt)
                 return result
 
             except Exception as e:
-                last_exception = e
-                
                 if not self._is_retryable_exception(e):
-                    logger.debug(f"Non-retryable exception: {type(e).__name__}")
+                    logger.debug("Non-retryable exception: %s", type(e).__name__)
                     raise
-                
-                if attempt == self.config.max_attempts:
-                    logger.error(
-                        f"All {self.config.max_attempts} retry attempts failed. "
-                        f"Last error: {e}"
-                    )
-                    break
-                
-                delay = self._calculate_delay(attempt)
-                logger.warning(
-                    f"Attempt {attempt} failed with {type(e).__name__}: {e}. "
-                    f"Retrying in {delay:.2f}s"
-                )
-                
-                await asyncio.sleep(delay)
+                last_exception = e
 
         # All attempts exhausted
+        logger.error(
+            f"All {self.config.max_attempts} retry attempts failed. "
+            f"Last error: {last_exception}"
+        )
         raise RetryError(
             f"Function failed after {self.config.max_attempts} attempts",
             last_exception,
@@ -186,41 +223,43 @@ class RetryService:
         Raises:
             RetryError: When all attempts are exhausted
         """
-        last_exception = None
-        
-        for attempt in range(1, self.config.max_attempts + 1):
+        # Fast path: most calls succeed on the first attempt
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            if not self._is_retryable_exception(e):
+                logger.debug("Non-retryable exception: %s", type(e).__name__)
+                raise
+            last_exception = e
+
+        for attempt in range(2, self.config.max_attempts + 1):
+            delay = self._get_retry_delay(attempt - 1, last_exception)
+            logger.warning(
+                "Attempt %d failed with %s: %s. Retrying in %.2fs",
+                attempt - 1,
+                type(last_exception).__name__,
+                last_exception,
+                delay,
+            )
+            time.sleep(delay)
+
             try:
-                logger.debug(f"Retry attempt {attempt}/{self.config.max_attempts}")
+                logger.debug("Retry attempt %d/%d", attempt, self.config.max_attempts)
                 result = func(*args, **kwargs)
-                
-                if attempt > 1:
-                    logger.info(f"Function succeeded on attempt {attempt}")
-                
+                logger.info("Function succeeded on attempt %d", attempt)
                 return result
 
             except Exception as e:
-                last_exception = e
-                
                 if not self._is_retryable_exception(e):
-                    logger.debug(f"Non-retryable exception: {type(e).__name__}")
+                    logger.debug("Non-retryable exception: %s", type(e).__name__)
                     raise
-                
-                if attempt == self.config.max_attempts:
-                    logger.error(
-                        f"All {self.config.max_attempts} retry attempts failed. "
-                        f"Last error: {e}"
-                    )
-                    break
-                
-                delay = self._calculate_delay(attempt)
-                logger.warning(
-                    f"Attempt {attempt} failed with {type(e).__name__}: {e}. "
-                    f"Retrying in {delay:.2f}s"
-                )
-                
-                time.sleep(delay)
+                last_exception = e
 
         # All attempts exhausted
+        logger.error(
+            f"All {self.config.max_attempts} retry attempts failed. "
+            f"Last error: {last_exception}"
+        )
         raise RetryError(
             f"Function failed after {self.config.max_attempts} attempts",
             last_exception,
@@ -228,10 +267,34 @@ class RetryService:
         )
 
 
-# Pre-configured retry services for common scenarios
-def get_database_retry_service() -> RetryService:
-    """Get retry service configured for database operations."""
-    config = RetryConfig(
+def retry_after_hint(exception: Exception) -> Optional[float]:
+    """
+    Read a Retry-After header (in seconds) from an HTTP exception.
+
+    Args:
+        exception: Exception that may carry response headers
+
+    Returns:
+        Seconds to wait, or None if the exception carries no usable hint
+    """
+    headers = getattr(exception, "headers", None)
+    if headers is None:
+        headers = getattr(getattr(exception, "response", None), "headers", None)
+    if not headers:
+        return None
+
+    value = headers.get("Retry-After") or headers.get("retry-after")
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        # Missing, or an HTTP-date we don't bother parsing
+        return None
+
+
+# Pre-configured retry services for common scenarios.
+# RetryService holds no per-call state, so each is built once and shared.
+_DATABASE_RETRY_SERVICE = RetryService(
+    RetryConfig(
         max_attempts=3,
         base_delay=0.5,
         max_delay=5.0,
@@ -244,12 +307,10 @@ def get_database_retry_service() -> RetryService:
             OSError,
         )
     )
-    return RetryService(config)
+)
 
-
-def get_api_retry_service() -> RetryService:
-    """Get retry service configured for API calls."""
-    config = RetryConfig(
+_API_RETRY_SERVICE = RetryService(
+    RetryConfig(
         max_attempts=4,
         base_delay=1.0,
         max_delay=30.0,
@@ -260,14 +321,13 @@ def get_api_retry_service() -> RetryService:
             ConnectionError,
             TimeoutError,
             OSError,
-        )
+        ),
+        delay_hint_fn=retry_after_hint,
     )
-    return RetryService(config)
-
+)
 
-def get_telegram_retry_service() -> RetryService:
-    """Get retry service configured for Telegram API calls."""
-    config = RetryConfig(
+_TELEGRAM_RETRY_SERVICE = RetryService(
+    RetryConfig(
         max_attempts=3,
         base_delay=2.0,
         max_delay=20.0,
@@ -280,25 +340,45 @@ def get_telegram_retry_service() -> RetryService:
             OSError,
         )
     )
-    return RetryService(config)
-
+)
 
-def get_stripe_retry_service() -> RetryService:
-    """Get retry service configured for Stripe API calls."""
-    config = RetryConfig(
+_STRIPE_RETRY_SERVICE = RetryService(
+    RetryConfig(
         max_attempts=4,
         base_delay=1.0,
         max_delay=30.0,
         strategy=RetryStrategy.EXPONENTIAL_BACKOFF,
         jitter=True,
+        # Stripe's own connection and rate-limit errors are retried inside
+        # the SDK (stripe.max_network_retries, which honours Retry-After and
+        # Stripe-Should-Retry); listing them here would multiply the requests
         retryable_exceptions=(
-            # Stripe specific retryable errors
             ConnectionError,
             TimeoutError,
             OSError,
         )
     )
-    return RetryService(config)
+)
+
+
+def get_database_retry_service() -> RetryService:
+    """Get retry service configured for database operations."""
+    return _DATABASE_RETRY_SERVICE
+
+
+def get_api_retry_service() -> RetryService:
+    """Get retry service configured for API calls."""
+    return _API_RETRY_SERVICE
+
+
+def get_telegram_retry_service() -> RetryService:
+    """Get retry service configured for Telegram API calls."""
+    return _TELEGRAM_RETRY_SERVICE
+
+
+def get_stripe_retry_service() -> RetryService:
+    """Get retry service configured for Stripe API calls."""
+    return _STRIPE_RETRY_SERVICE
 
 
 # Decorator functions for easy usage
@@ -321,14 +401,17 @@ def retry_async(
         Decorated function
     """
     def decorator(func: Callable):
-        async def wrapper(*args, **kwargs):
-            config = RetryConfig(
+        retry_service = RetryService(
+            RetryConfig(
                 max_attempts=max_attempts,
                 base_delay=base_delay,
                 strategy=strategy,
                 retryable_exceptions=retryable_exceptions
             )
-            retry_service = RetryService(config)
+        )
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
             return await retry_service.execute_async(func, *args, **kwargs)
         return wrapper
     return decorator
@@ -353,20 +436,49 @@ def retry_sync(
         Decorated function
     """
     def decorator(func: Callable):
-        def wrapper(*args, **kwargs):
-            config = RetryConfig(
+        retry_service = RetryService(
+            RetryConfig(
                 max_attempts=max_attempts,
                 base_delay=base_delay,
                 strategy=strategy,
                 retryable_exceptions=retryable_exceptions
             )
-            retry_service = RetryService(config)
+        )
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
             return retry_service.execute_sync(func, *args, **kwargs)
         return wrapper
     return decorator
 
 
 # Convenience functions for common patterns
+@functools.lru_cache(maxsize=32)
+def _exponential_backoff_service(
+    max_attempts: int, base_delay: float, max_delay: float
+) -> RetryService:
+    """
+    Get a shared exponential-backoff retry service for one argument set.
+
+    Args:
+        max_attempts: Maximum number of attempts
+        base_delay: Base delay in seconds
+        max_delay: Maximum delay in seconds
+
+    Returns:
+        Retry service built once per distinct argument set
+    """
+    return RetryService(
+        RetryConfig(
+            max_attempts=max_attempts,
+            base_delay=base_delay,
+            max_delay=max_delay,
+            strategy=RetryStrategy.EXPONENTIAL_BACKOFF,
+            jitter=True,
+        )
+    )
+
+
 async def retry_with_exponential_backoff(
     func: Callable,
     max_attempts: int = 3,
@@ -392,15 +504,8 @@ async def retry_with_exponential_backoff(
     Raises:
         RetryError: When all attempts are exhausted
     """
-    config = RetryConfig(
-        max_attempts=max_attempts,
-        base_delay=base_delay,
-        max_delay=max_delay,
-        strategy=RetryStrategy.EXPONENTIAL_BACKOFF,
-        jitter=True
-    )
-    retry_service = RetryService(config)
-    
+    retry_service = _exponential_backoff_service(max_attempts, base_delay, max_delay)
+
     if asyncio.iscoroutinefunction(func):
         return await retry_service.execute_async(func, *args, **kwargs)
     else:
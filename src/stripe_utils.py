@@ -6,20 +6,86 @@ customer portal, webhook processing, and payment management with proper
 security and idempotency handling.
 """
 
+import asyncio
+import json
 import logging
+import secrets
+import time
 import uuid
-from typing import Optional, Dict, Any
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Mapping, Optional
+import requests
+from requests.adapters import HTTPAdapter
 import stripe
-import os
 
-from src.config import STRIPE_API_KEY, STRIPE_WEBHOOK_SECRET, WEBHOOK_URL
+from src.config import (
+    STRIPE_API_KEY,
+    STRIPE_CUSTOMER_EMAIL_DOMAIN,
+    STRIPE_WEBHOOK_SECRET,
+    WEBHOOK_URL,
+)
 from src import database as db
+from src.cache import (
+    get_product_by_price_id_cached,
+    get_stripe_customer_id_cached,
+    has_user_made_purchases_cached,
+    mark_user_has_purchased,
+    set_stripe_customer_id_cached,
+)
+
+
+# Retries per Stripe request, done by the SDK with idempotency keys
+STRIPE_MAX_NETWORK_RETRIES = 2
+
+
+def _create_stripe_http_client() -> stripe.RequestsClient:
+    """
+    Create a Stripe HTTP client backed by one pooled keep-alive session,
+    so API calls reuse TCP/TLS connections instead of reconnecting.
+
+    Returns:
+        Configured Stripe HTTP client
+    """
+    session = requests.Session()
+    # Retries are left to stripe's max_network_retries so they don't stack
+    session.mount(
+        "https://", HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=0)
+    )
+    # Stay well inside the Gunicorn worker timeout
+    return stripe.RequestsClient(session=session, timeout=15)
+
 
 # Configure Stripe
 stripe.api_key = STRIPE_API_KEY
+stripe.default_http_client = _create_stripe_http_client()
+# The SDK is the only retry layer for Stripe network and rate-limit errors;
+# it backs off and follows Retry-After/Stripe-Should-Retry
+stripe.max_network_retries = STRIPE_MAX_NETWORK_RETRIES
 
 logger = logging.getLogger(__name__)
 
+# Users recharged in parallel; each holds a Stripe and a database connection
+AUTO_RECHARGE_CONCURRENCY = 5
+# Concurrent result notifications, kept under Telegram's ~30 messages/s
+AUTO_RECHARGE_NOTIFY_CONCURRENCY = 20
+
+# Auto-recharge notifications, built once at import
+_AUTO_RECHARGE_SUCCESS_TEMPLATE = (
+    "🔄 **Auto-Recharge Successful!**\n\n"
+    "Your account has been automatically recharged with **{product_name}**.\n\n"
+    "💰 **Credits added to your balance**\n"
+    "🔔 **Auto-recharge keeps you connected**\n\n"
+    "Use /balance to see your updated balance."
+)
+_AUTO_RECHARGE_FAILED_MESSAGE = (
+    "⚠️ **Auto-Recharge Failed**\n\n"
+    "We couldn't automatically recharge your account.\n\n"
+    "💳 **Please check your payment method**\n"
+    "🔧 **Update billing info:** /billing\n"
+    "🛒 **Manual purchase:** /buy\n\n"
+    "Your auto-recharge is still enabled and will try again when your credits get low."
+)
+
 
 class StripeError(Exception):
     """Raised when Stripe operations fail."""
@@ -53,19 +119,15 @@ def create_checkout_session(
     Raises:
         StripeError: If session creation fails
     """
-    logger.info(f"Creating checkout session for user {user_id}, price {price_id}")
+    logger.info("Creating checkout session for user %s, price %s", user_id, price_id)
 
-    # Generate idempotency key for safe retries
-    idempotency_key = str(uuid.uuid4())
+    # One key per checkout attempt; it is stored on the transaction row
+    # and reused by the SDK's network retries
+    idempotency_key = secrets.token_hex(16)
 
     try:
-        # Get or create user
-        user_data = db.get_user(user_id)
-        if not user_data:
-            raise StripeError(f"User {user_id} not found in database")
-
         # Get product information
-        product = db.get_product_by_stripe_price_id(price_id)
+        product = get_product_by_price_id_cached(price_id)
         if not product:
             raise StripeError(f"Product with price ID {price_id} not found")
 
@@ -75,13 +137,11 @@ def create_checkout_session(
         if not cancel_url:
             cancel_url = f"{WEBHOOK_URL}/cancel"
 
-        # Create or get Stripe customer
-        customer_id = user_data.get("stripe_customer_id")
-        if not customer_id:
-            customer_id = create_stripe_customer(user_id, user_data)
+        # Usually created already when the user opened the catalog
+        customer_id = ensure_stripe_customer(user_id)
 
         # Determine if this is the user's first purchase for the auto-recharge prompt
-        is_first_purchase = not db.has_user_made_purchases(user_id)
+        is_first_purchase = not has_user_made_purchases_cached(user_id)
 
         # Pre-calculate credits and time for clarity
         credits_to_grant = (
@@ -93,18 +153,9 @@ def create_checkout_session(
             product.get("amount", 0) if product.get("product_type") == "time" else 0
         )
 
-        transaction = db.log_transaction(
-            user_id=user_id,
-            product_id=product["id"],
-            stripe_charge_id=None,
-            stripe_session_id=None,  # Will be updated after session creation
-            idempotency_key=idempotency_key,
-            amount_cents=product["price_usd_cents"],
-            credits_granted=credits_to_grant,
-            time_granted_seconds=time_to_grant,
-            status="pending",
-            description=f"Purchase: {product['name']}",
-        )
+        # Chosen up front so the Stripe metadata can reference it and the
+        # row is written once, with the session ID, after the Stripe call
+        transaction_id = str(uuid.uuid4())
 
         # Create checkout session with idempotency key
         session = stripe.checkout.Session.create(
@@ -116,7 +167,7 @@ def create_checkout_session(
             metadata={
                 "user_id": str(user_id),
                 "product_id": str(product["id"]),
-                "transaction_id": str(transaction["id"]),
+                "transaction_id": transaction_id,
                 "credits_granted": str(credits_to_grant),
                 "time_granted_seconds": str(time_to_grant),
                 "is_first_purchase": str(is_first_purchase),
@@ -126,14 +177,32 @@ def create_checkout_session(
             idempotency_key=idempotency_key,
         )
 
-        # Update transaction with session ID
-        db.update_transaction_status(
-            transaction_id=transaction["id"],
-            status="pending",
-            stripe_charge_id=session.id,
-        )
+        try:
+            db.log_transaction(
+                user_id=user_id,
+                product_id=product["id"],
+                stripe_charge_id=None,
+                stripe_session_id=session.id,
+                idempotency_key=idempotency_key,
+                amount_cents=product["price_usd_cents"],
+                credits_granted=credits_to_grant,
+                time_granted_seconds=time_to_grant,
+                status="pending",
+                description=f"Purchase: {product['name']}",
+                transaction_id=transaction_id,
+            )
+        except Exception:
+            # Without a pending row the payment could never be credited,
+            # so make sure the session can't be paid
+            try:
+                stripe.checkout.Session.expire(session.id)
+            except stripe.error.StripeError as expire_error:
+                logger.error(
+                    f"Failed to expire orphaned checkout session {session.id}: {expire_error}"
+                )
+            raise
 
-        logger.info(f"✅ Created checkout session {session.id} for user {user_id}")
+        logger.info("✅ Created checkout session %s for user %s", session.id, user_id)
         return session.url
 
     except stripe.error.StripeError as e:
@@ -144,6 +213,30 @@ def create_checkout_session(
         raise StripeError(f"Failed to create checkout session: {e}")
 
 
+def ensure_stripe_customer(user_id: int) -> str:
+    """
+    Get the user's Stripe customer ID, creating the customer if needed.
+    Safe to call concurrently: creation is idempotent per user.
+
+    Args:
+        user_id: User's Telegram ID
+
+    Returns:
+        Stripe customer ID
+
+    Raises:
+        StripeError: If the user is unknown or customer creation fails
+    """
+    customer_id = get_stripe_customer_id_cached(user_id)
+    if customer_id:
+        return customer_id
+
+    user_data = db.get_user(user_id)
+    if not user_data:
+        raise StripeError(f"User {user_id} not found in database")
+    return create_stripe_customer(user_id, user_data)
+
+
 def create_stripe_customer(user_id: int, user_data: Dict[str, Any]) -> str:
     """
     Create Stripe customer for user.
@@ -155,15 +248,16 @@ def create_stripe_customer(user_id: int, user_data: Dict[str, Any]) -> str:
     Returns:
         Stripe customer ID
     """
-    logger.info(f"Creating Stripe customer for user {user_id}")
+    logger.info("Creating Stripe customer for user %s", user_id)
 
     try:
-        # Generate idempotency key
-        idempotency_key = str(uuid.uuid4())
+        # One customer per Telegram user, so retries and double clicks
+        # collapse into a single Stripe customer
+        idempotency_key = f"customer:{user_id}"
 
         # Create customer
         customer = stripe.Customer.create(
-            email=f"user.{user_id}@{os.getenv('STRIPE_CUSTOMER_EMAIL_DOMAIN', 'example.com')}",
+            email=f"user.{user_id}@{STRIPE_CUSTOMER_EMAIL_DOMAIN}",
             name=f"{user_data['first_name']} {user_data.get('last_name', '')}".strip(),
             metadata={
                 "telegram_id": str(user_id),
@@ -174,8 +268,9 @@ def create_stripe_customer(user_id: int, user_data: Dict[str, Any]) -> str:
 
         # Update user record with Stripe customer ID
         db.update_user_stripe_customer(user_id, customer.id)
+        set_stripe_customer_id_cached(user_id, customer.id)
 
-        logger.info(f"✅ Created Stripe customer {customer.id} for user {user_id}")
+        logger.info("✅ Created Stripe customer %s for user %s", customer.id, user_id)
         return customer.id
 
     except stripe.error.StripeError as e:
@@ -204,7 +299,7 @@ def create_billing_portal_session(
     Raises:
         StripeError: If portal session creation fails
     """
-    logger.info(f"Creating billing portal session for customer {customer_id}")
+    logger.info("Creating billing portal session for customer %s", customer_id)
 
     try:
         # Set default return URL if not provided
@@ -212,7 +307,7 @@ def create_billing_portal_session(
             return_url = f"{WEBHOOK_URL}/billing-complete"
 
         # Generate idempotency key
-        idempotency_key = str(uuid.uuid4())
+        idempotency_key = secrets.token_hex(16)
 
         # Create portal session
         session = stripe.billing_portal.Session.create(
@@ -221,7 +316,7 @@ def create_billing_portal_session(
             idempotency_key=idempotency_key,
         )
 
-        logger.info(f"✅ Created billing portal session for customer {customer_id}")
+        logger.info("✅ Created billing portal session for customer %s", customer_id)
         return session.url
 
     except stripe.error.StripeError as e:
@@ -234,25 +329,31 @@ def create_billing_portal_session(
 # =============================================================================
 
 
-def verify_webhook_signature(payload: bytes, signature: str) -> Dict[str, Any]:
+def verify_webhook_signature(payload: str, signature: str) -> Dict[str, Any]:
     """
     Verify Stripe webhook signature and return event.
 
     Args:
-        payload: Raw request body as bytes
+        payload: Raw request body decoded as UTF-8
         signature: Stripe signature header
 
     Returns:
-        Verified Stripe event
+        Verified Stripe event as a plain dict
 
     Raises:
         StripeError: If signature verification fails
     """
     try:
-        event = stripe.Webhook.construct_event(
-            payload, signature, STRIPE_WEBHOOK_SECRET
+        # Verify, then parse once into plain dicts; handlers only need
+        # item access, not the StripeObject tree construct_event builds
+        stripe.WebhookSignature.verify_header(
+            payload,
+            signature,
+            STRIPE_WEBHOOK_SECRET,
+            tolerance=stripe.Webhook.DEFAULT_TOLERANCE,
         )
-        logger.info(f"✅ Verified webhook event: {event['type']}")
+        event = json.loads(payload)
+        logger.info("✅ Verified webhook event: %s", event["type"])
         return event
 
     except ValueError as e:
@@ -269,9 +370,27 @@ def verify_webhook_signature(payload: bytes, signature: str) -> Dict[str, Any]:
 # =============================================================================
 
 
+def _is_idempotent_replay(headers: Optional[Mapping[str, str]]) -> bool:
+    """
+    Check whether Stripe answered a request from its idempotency cache.
+
+    Args:
+        headers: Response headers of a Stripe object or error, if any
+
+    Returns:
+        True if the response replays an earlier request with the same key
+    """
+    if not headers:
+        return False
+    return any(
+        name.lower() == "idempotent-replayed" and value == "true"
+        for name, value in headers.items()
+    )
+
+
 def trigger_auto_recharge(
     user_id: int, product_price_id: str, product_name: str
-) -> bool:
+) -> Optional[bool]:
     """
     Trigger auto-recharge for a user with low credits.
 
@@ -281,37 +400,61 @@ def trigger_auto_recharge(
         product_name: Name of the product for logging
 
     Returns:
-        True if auto-recharge was triggered successfully
+        True if a new auto-recharge charge was created, False if it failed,
+        None if Stripe replayed an earlier attempt for the same balance
     """
-    logger.info(f"Triggering auto-recharge for user {user_id}, product: {product_name}")
+    logger.info(
+        "Triggering auto-recharge for user %s, product: %s", user_id, product_name
+    )
 
     try:
-        # Get user data
-        user_data = db.get_user(user_id)
-        if not user_data or not user_data.get("stripe_customer_id"):
-            logger.warning(f"Cannot auto-recharge user {user_id}: No Stripe customer")
+        customer_id = get_stripe_customer_id_cached(user_id)
+        if not customer_id:
+            logger.warning("Cannot auto-recharge user %s: No Stripe customer", user_id)
             return False
 
         # Check for recent failed payments
         recent_failures = db.check_failed_payments(user_id, days=7)
         if recent_failures >= 3:
             logger.warning(
-                f"Skipping auto-recharge for user {user_id}: {recent_failures} recent failed payments"
+                "Skipping auto-recharge for user %s: %s recent failed payments",
+                user_id,
+                recent_failures,
             )
             # Disable auto-recharge to prevent continued failures
             db.disable_auto_recharge(user_id)
             return False
 
-        # Generate idempotency key
-        idempotency_key = str(uuid.uuid4())
+        product = get_product_by_price_id_cached(product_price_id)
+        if not product:
+            logger.warning(
+                "Cannot auto-recharge user %s: unknown price %s",
+                user_id,
+                product_price_id,
+            )
+            return False
+
+        user = db.get_user(user_id)
+        if not user:
+            logger.warning("Cannot auto-recharge user %s: user not found", user_id)
+            return False
+
+        # Key the charge on the balance state that triggered it: runs that
+        # race in several workers see the same state and share one payment,
+        # while any credit change since (usage or a grant) bumps updated_at
+        # and allows the next recharge
+        updated_at = user.get("updated_at")
+        balance_state = (
+            f"{user.get('message_credits')}:"
+            f"{updated_at.isoformat() if updated_at else 'never'}"
+        )
+        idempotency_key = f"autorecharge:{user_id}:{balance_state}"
 
         # Create payment intent for auto-recharge (not checkout session)
         payment_intent = stripe.PaymentIntent.create(
-            amount=db.get_product_by_stripe_price_id(product_price_id)[
-                "price_usd_cents"
-            ],
+            amount=product["price_usd_cents"],
             currency="usd",
-            customer=user_data["stripe_customer_id"],
+            customer=customer_id,
             confirm=True,
             off_session=True,  # Indicates this is for an existing customer
             metadata={
@@ -322,14 +465,38 @@ def trigger_auto_recharge(
             idempotency_key=idempotency_key,
         )
 
+        response = getattr(payment_intent, "last_response", None)
+        if response is not None and _is_idempotent_replay(response.headers):
+            logger.info(
+                "Auto-recharge for user %s already attempted at this balance: %s",
+                user_id,
+                payment_intent.id,
+            )
+            return None
+
         logger.info(
-            f"✅ Auto-recharge payment intent created for user {user_id}: {payment_intent.id}"
+            "✅ Auto-recharge payment intent created for user %s: %s",
+            user_id,
+            payment_intent.id,
         )
         return True
 
     except stripe.error.CardError as e:
+        # Stripe caches declines too, so a replay was reported when it first ran
+        if _is_idempotent_replay(e.headers):
+            logger.info(
+                "Auto-recharge for user %s already declined at this balance: %s",
+                user_id,
+                e,
+            )
+            return None
         # Card was declined
-        logger.warning(f"Auto-recharge card declined for user {user_id}: {e}")
+        logger.warning("Auto-recharge card declined for user %s: %s", user_id, e)
+        return False
+
+    except stripe.error.IdempotencyError as e:
+        # Key reused with different parameters (e.g. a changed product)
+        logger.warning("Auto-recharge already attempted for user %s: %s", user_id, e)
         return False
 
     except stripe.error.AuthenticationError as e:
@@ -342,6 +509,59 @@ def trigger_auto_recharge(
         return False
 
 
+async def _auto_recharge_user(
+    telegram_app,
+    user_data: Dict[str, Any],
+    semaphore: asyncio.Semaphore,
+    notify_semaphore: asyncio.Semaphore,
+) -> None:
+    """
+    Recharge one user and notify them of the result.
+
+    Args:
+        telegram_app: Telegram application instance for sending notifications
+        user_data: Row from get_users_needing_auto_recharge
+        semaphore: Bounds concurrent Stripe calls across users
+        notify_semaphore: Bounds concurrent Telegram sends across users
+    """
+    user_id = user_data["telegram_id"]
+    product_name = user_data["product_name"]
+    price_id = user_data["stripe_price_id"]
+
+    try:
+        # Attempt auto-recharge; the Stripe call blocks, so run it off the loop
+        async with semaphore:
+            success = await asyncio.to_thread(
+                trigger_auto_recharge, user_id, price_id, product_name
+            )
+
+        # A replayed attempt was already reported when it first ran
+        if success is None:
+            return
+
+        # Notify the user; the send overlaps with other users' Stripe calls
+        if success:
+            message = _AUTO_RECHARGE_SUCCESS_TEMPLATE.format(product_name=product_name)
+        else:
+            message = _AUTO_RECHARGE_FAILED_MESSAGE
+
+        try:
+            async with notify_semaphore:
+                await telegram_app.bot.send_message(
+                    chat_id=user_id, text=message, parse_mode="Markdown"
+                )
+        except Exception as msg_error:
+            logger.warning(
+                "Failed to send auto-recharge %s message to user %s: %s",
+                "success" if success else "failure",
+                user_id,
+                msg_error,
+            )
+
+    except Exception as e:
+        logger.error(f"Error processing auto-recharge for user {user_id}: {e}")
+
+
 async def process_auto_recharge_users(telegram_app):
     """
     Process all users who need auto-recharge.
@@ -359,68 +579,120 @@ async def process_auto_recharge_users(telegram_app):
             logger.info("No users need auto-recharge at this time")
             return
 
-        logger.info(f"Found {len(users_needing_recharge)} users needing auto-recharge")
-
-        for user_data in users_needing_recharge:
-            user_id = user_data["telegram_id"]
-            product_name = user_data["product_name"]
-            price_id = user_data["stripe_price_id"]
+        logger.info("Found %d users needing auto-recharge", len(users_needing_recharge))
 
-            try:
-                # Attempt auto-recharge
-                success = trigger_auto_recharge(user_id, price_id, product_name)
-
-                if success:
-                    # Send success notification to user
-                    message = (
-                        f"🔄 **Auto-Recharge Successful!**\n\n"
-                        f"Your account has been automatically recharged with **{product_name}**.\n\n"
-                        f"💰 **Credits added to your balance**\n"
-                        f"🔔 **Auto-recharge keeps you connected**\n\n"
-                        f"Use /balance to see your updated balance."
-                    )
-
-                    try:
-                        await telegram_app.bot.send_message(
-                            chat_id=user_id, text=message, parse_mode="Markdown"
-                        )
-                    except Exception as msg_error:
-                        logger.warning(
-                            f"Failed to send auto-recharge success message to user {user_id}: {msg_error}"
-                        )
-
-                else:
-                    # Send failure notification to user
-                    message = (
-                        "⚠️ **Auto-Recharge Failed**\n\n"
-                        "We couldn't automatically recharge your account.\n\n"
-                        "💳 **Please check your payment method**\n"
-                        "🔧 **Update billing info:** /billing\n"
-                        "🛒 **Manual purchase:** /buy\n\n"
-                        "Your auto-recharge is still enabled and will try again when your credits get low."
-                    )
-
-                    try:
-                        await telegram_app.bot.send_message(
-                            chat_id=user_id, text=message, parse_mode="Markdown"
-                        )
-                    except Exception as msg_error:
-                        logger.warning(
-                            f"Failed to send auto-recharge failure message to user {user_id}: {msg_error}"
-                        )
-
-            except Exception as e:
-                logger.error(f"Error processing auto-recharge for user {user_id}: {e}")
-                continue
+        semaphore = asyncio.Semaphore(AUTO_RECHARGE_CONCURRENCY)
+        notify_semaphore = asyncio.Semaphore(AUTO_RECHARGE_NOTIFY_CONCURRENCY)
+        await asyncio.gather(
+            *(
+                _auto_recharge_user(
+                    telegram_app, user_data, semaphore, notify_semaphore
+                )
+                for user_data in users_needing_recharge
+            )
+        )
 
         logger.info(
-            f"✅ Completed auto-recharge processing for {len(users_needing_recharge)} users"
+            "✅ Completed auto-recharge processing for %d users",
+            len(users_needing_recharge),
         )
 
     except Exception as e:
         logger.error(f"Error in auto-recharge processing: {e}")
 
 
+# =============================================================================
+# CHECKOUT COMPLETION
+# =============================================================================
+
+
+@dataclass(frozen=True, slots=True)
+class CheckoutCompletedEvent:
+    """Fields of a checkout.session.completed event, parsed once."""
+
+    session_id: str
+    user_id: int
+    transaction_id: str
+    product_id: Optional[int]
+    credits_granted: int
+    time_granted_seconds: int
+    is_first_purchase: bool
+
+    @classmethod
+    def from_event(cls, event: Dict[str, Any]) -> "CheckoutCompletedEvent":
+        """
+        Build the record from a Stripe webhook event.
+
+        Args:
+            event: Stripe checkout.session.completed event
+
+        Returns:
+            Parsed checkout event
+
+        Raises:
+            KeyError, ValueError: If required metadata is missing or malformed
+        """
+        session = event["data"]["object"]
+        metadata = session.get("metadata", {})
+        product_id = metadata.get("product_id")
+
+        return cls(
+            session_id=session["id"],
+            user_id=int(metadata["user_id"]),
+            transaction_id=metadata["transaction_id"],
+            product_id=int(product_id) if product_id else None,
+            credits_granted=int(metadata.get("credits_granted", 0)),
+            time_granted_seconds=int(metadata.get("time_granted_seconds", 0)),
+            # Recorded at checkout creation, before this transaction completed
+            is_first_purchase=metadata.get("is_first_purchase") == "True",
+        )
+
+
+def process_checkout_completed(event: Dict[str, Any]) -> bool:
+    """
+    Enhanced checkout completion processing.
+
+    Args:
+        event: Stripe webhook event
+
+    Returns:
+        True if processed successfully
+    """
+    logger.info("Processing checkout completed: %s", event["data"]["object"]["id"])
+
+    try:
+        checkout = CheckoutCompletedEvent.from_event(event)
+
+        # After a first purchase, prompt for auto-recharge on the user's next
+        # interaction; stored with the credits so both commit together
+        prompt_product_id = checkout.product_id if checkout.is_first_purchase else None
+
+        # Update database - mark transaction as completed
+        success = db.complete_transaction_and_add_credits(
+            user_id=checkout.user_id,
+            transaction_id=checkout.transaction_id,
+            credits_granted=checkout.credits_granted,
+            time_granted_seconds=checkout.time_granted_seconds,
+            auto_recharge_prompt_product_id=prompt_product_id,
+        )
+
+        if success:
+            logger.info(
+                "✅ Successfully processed checkout for user %s", checkout.user_id
+            )
+            mark_user_has_purchased(checkout.user_id)
+            return True
+        else:
+            logger.error(
+                f"Failed to complete transaction and add credits for user {checkout.user_id}"
+            )
+            return False
+
+    except Exception as e:
+        logger.error(f"Error processing checkout completed: {e}")
+        return False
+
+
 # =============================================================================
 # PAYMENT FAILURE HANDLING
 # =============================================================================
@@ -437,17 +709,18 @@ def process_payment_failed(event: Dict[str, Any]) -> bool:
         True if processed successfully
     """
     payment_intent = event["data"]["object"]
-    logger.info(f"Processing payment failed: {payment_intent['id']}")
+    logger.info("Processing payment failed: %s", payment_intent["id"])
 
     try:
         # Extract user info from metadata
-        user_id = payment_intent["metadata"].get("user_id")
+        metadata = payment_intent.get("metadata") or {}
+        user_id = metadata.get("user_id")
         if not user_id:
             logger.warning("No user_id in payment intent metadata")
             return True
 
         user_id = int(user_id)
-        is_auto_recharge = payment_intent["metadata"].get("auto_recharge") == "true"
+        is_auto_recharge = metadata.get("auto_recharge") == "true"
 
         # Get failure reason
         last_error = payment_intent.get("last_payment_error", {})
@@ -455,18 +728,23 @@ def process_payment_failed(event: Dict[str, Any]) -> bool:
         failure_message = last_error.get("message", "Payment failed")
 
         logger.info(
-            f"Payment failed for user {user_id}: {failure_code} - {failure_message}"
+            "Payment failed for user %s: %s - %s",
+            user_id,
+            failure_code,
+            failure_message,
         )
 
-        # Check if this user has had multiple recent failures
-        recent_failures = db.check_failed_payments(user_id, days=7)
-
-        # Disable auto-recharge if too many failures
-        if is_auto_recharge and recent_failures >= 2:
-            db.disable_auto_recharge(user_id)
-            logger.info(
-                f"Disabled auto-recharge for user {user_id} due to {recent_failures + 1} failed payments"
-            )
+        # Disable auto-recharge if it has failed repeatedly; the failure
+        # count only matters for auto-recharge payments
+        if is_auto_recharge:
+            recent_failures = db.check_failed_payments(user_id, days=7)
+            if recent_failures >= 2:
+                db.disable_auto_recharge(user_id)
+                logger.info(
+                    "Disabled auto-recharge for user %s due to %d failed payments",
+                    user_id,
+                    recent_failures + 1,
+                )
 
         # Log the failure in our database (you may want to implement this)
         # db.log_payment_failure(user_id, payment_intent['id'], failure_code, failure_message)
@@ -491,21 +769,22 @@ def process_dispute_created(event: Dict[str, Any]) -> bool:
     dispute = event["data"]["object"]
     charge_id = dispute["charge"]
 
-    logger.warning(f"Dispute created for charge {charge_id}")
+    logger.warning("Dispute created for charge %s", charge_id)
 
     try:
-        # Get charge details
+        # Disputes only reference the charge, which carries the customer
         charge = stripe.Charge.retrieve(charge_id)
 
         # Extract customer and user information
         customer_id = charge.get("customer")
         if customer_id:
-            customer = stripe.Customer.retrieve(customer_id)
-            user_id = customer["metadata"].get("telegram_id")
+            user_id = get_user_id_by_customer(customer_id)
 
             if user_id:
                 logger.warning(
-                    f"🚨 DISPUTE ALERT: User {user_id} initiated chargeback for charge {charge_id}"
+                    "🚨 DISPUTE ALERT: User %s initiated chargeback for charge %s",
+                    user_id,
+                    charge_id,
                 )
 
                 # You could implement logic here to:
@@ -534,19 +813,15 @@ def process_customer_subscription_deleted(event: Dict[str, Any]) -> bool:
     subscription = event["data"]["object"]
     customer_id = subscription["customer"]
 
-    logger.info(f"Subscription deleted for customer {customer_id}")
+    logger.info("Subscription deleted for customer %s", customer_id)
 
     try:
-        # Get customer details
-        customer = stripe.Customer.retrieve(customer_id)
-        user_id = customer["metadata"].get("telegram_id")
+        user_id = get_user_id_by_customer(customer_id)
 
         if user_id:
-            user_id = int(user_id)
-
             # Disable auto-recharge for user
             # This would require adding auto_recharge_enabled field to users table
-            logger.info(f"✅ Disabled auto-recharge for user {user_id}")
+            logger.info("✅ Disabled auto-recharge for user %s", user_id)
 
             # You could implement logic here to:
             # 1. Update user's auto_recharge_enabled to False
@@ -565,6 +840,30 @@ def process_customer_subscription_deleted(event: Dict[str, Any]) -> bool:
 # =============================================================================
 
 
+def process_payment_method_attached(event: Dict[str, Any]) -> bool:
+    """
+    Process payment_method.attached webhook event.
+
+    Args:
+        event: Stripe webhook event
+
+    Returns:
+        True (no action needed)
+    """
+    logger.info("Payment method attached - no action needed")
+    return True
+
+
+# Handlers by Stripe event type
+_WEBHOOK_HANDLERS: Dict[str, Callable[[Dict[str, Any]], bool]] = {
+    "checkout.session.completed": process_checkout_completed,
+    "payment_intent.payment_failed": process_payment_failed,
+    "charge.dispute.created": process_dispute_created,
+    "customer.subscription.deleted": process_customer_subscription_deleted,
+    "payment_method.attached": process_payment_method_attached,
+}
+
+
 def process_webhook_event(event: Dict[str, Any]) -> bool:
     """
     Main webhook event processor.
@@ -576,32 +875,78 @@ def process_webhook_event(event: Dict[str, Any]) -> bool:
         True if event was processed successfully
     """
     event_type = event["type"]
-    logger.info(f"Processing webhook event: {event_type}")
+    logger.info("Processing webhook event: %s", event_type)
+
+    handler = _WEBHOOK_HANDLERS.get(event_type)
+    if handler is None:
+        logger.info("Unhandled webhook event type: %s", event_type)
+        return True  # Return True for unhandled events to avoid retries
 
+    started = time.perf_counter()
     try:
-        if event_type == "checkout.session.completed":
-            return process_checkout_completed(event)
+        success = handler(event)
+    except Exception as e:
+        logger.error(f"Error processing webhook event {event_type}: {e}")
+        return False
 
-        elif event_type == "payment_intent.payment_failed":
-            return process_payment_failed(event)
+    # Per-event-type timing, so slow handlers show up in the logs
+    logger.info(
+        "Webhook event %s handled in %.1f ms (success=%s)",
+        event_type,
+        (time.perf_counter() - started) * 1000,
+        success,
+    )
+    return success
 
-        elif event_type == "charge.dispute.created":
-            return process_dispute_created(event)
 
-        elif event_type == "customer.subscription.deleted":
-            return process_customer_subscription_deleted(event)
+# =============================================================================
+# WEBHOOK EVENT QUEUE
+# =============================================================================
 
-        elif event_type == "payment_method.attached":
-            logger.info("Payment method attached - no action needed")
-            return True
 
-        else:
-            logger.info(f"Unhandled webhook event type: {event_type}")
-            return True  # Return True for unhandled events to avoid retries
+def enqueue_webhook_event(event: Dict[str, Any], payload: str) -> bool:
+    """
+    Store a verified webhook event so it can be acknowledged immediately
+    and processed in the background.
 
-    except Exception as e:
-        logger.error(f"Error processing webhook event {event_type}: {e}")
-        return False
+    Args:
+        event: Verified Stripe webhook event
+        payload: Raw request body the event was parsed from
+
+    Returns:
+        True if the event was queued, False if it was already received
+    """
+    return db.enqueue_webhook_event(event["id"], event["type"], payload)
+
+
+def drain_webhook_events(batch_size: int = 20) -> int:
+    """
+    Process one batch of queued webhook events.
+
+    Args:
+        batch_size: Maximum number of events to claim
+
+    Returns:
+        Number of events processed
+    """
+    claimed = db.claim_webhook_events(limit=batch_size)
+
+    for row in claimed:
+        success = process_webhook_event(row["payload"])
+        status = db.finish_webhook_event(row["id"], success, row["attempts"])
+        if status == "failed":
+            logger.error(
+                f"Webhook event {row['event_id']} failed permanently after "
+                f"{row['attempts']} attempts"
+            )
+        elif not success:
+            logger.warning(
+                "Webhook event %s failed (attempt %d), retry scheduled",
+                row["event_id"],
+                row["attempts"],
+            )
+
+    return len(claimed)
 
 
 # =============================================================================
@@ -619,89 +964,58 @@ def get_customer_by_user_id(user_id: int) -> Optional[str]:
     Returns:
         Stripe customer ID or None
     """
-    user_data = db.get_user(user_id)
-    return user_data.get("stripe_customer_id") if user_data else None
+    return get_stripe_customer_id_cached(user_id)
 
 
-def format_price(amount_cents: int) -> str:
+def get_user_id_by_customer(customer_id: str) -> Optional[int]:
     """
-    Format price in cents to dollar string.
+    Get the Telegram ID for a Stripe customer.
+
+    Uses the locally stored customer ID and only asks Stripe for the
+    customer's metadata when no user row matches.
 
     Args:
-        amount_cents: Price in cents
+        customer_id: Stripe customer ID
 
     Returns:
-        Formatted price string (e.g., "$12.99")
+        User's Telegram ID or None
     """
-    return f"${amount_cents / 100:.2f}"
+    user_data = db.get_user_by_stripe_customer_id(customer_id)
+    if user_data:
+        return user_data["telegram_id"]
 
+    customer = stripe.Customer.retrieve(customer_id)
+    telegram_id = customer["metadata"].get("telegram_id")
+    return int(telegram_id) if telegram_id else None
 
-# Test Stripe connection on module import
-def process_checkout_completed(event: Dict[str, Any]) -> bool:
-    """
-    Enhanced checkout completion processing.
 
-    Args:
-        event: Stripe webhook event
+def check_stripe_connectivity() -> bool:
+    """
+    Verify the Stripe API is reachable with the configured key.
+    Makes a network call, so run it at startup rather than on import.
 
     Returns:
-        True if processed successfully
+        True if Stripe responded successfully
     """
-    session = event["data"]["object"]
-    logger.info(f"Processing checkout completed: {session['id']}")
-
     try:
-        metadata = session.get("metadata", {})
-        user_id = int(metadata["user_id"])
-        transaction_id = metadata["transaction_id"]
-        credits_granted = int(metadata.get("credits_granted", 0))
-        time_granted_seconds = int(metadata.get("time_granted_seconds", 0))
-
-        # Check if this is user's first purchase (before completing the transaction)
-        is_first_purchase = metadata.get("is_first_purchase") == "True"
-
-        # Update database - mark transaction as completed
-        success = db.complete_transaction_and_add_credits(
-            user_id=user_id,
-            transaction_id=transaction_id,
-            credits_granted=credits_granted,
-            time_granted_seconds=time_granted_seconds,
-        )
-
-        if success:
-            logger.info(
-                f"✅ Successfully processed checkout for user {user_id}"
-            )
-            # After successful processing, check if we need to trigger the auto-recharge prompt
-            if is_first_purchase:
-                product_id = int(metadata.get("product_id"))
-                
-                # Schedule auto-recharge prompt via database storage
-                # to avoid circular import with bot_factory
-                logger.info(
-                    f"Auto-recharge prompt needed for user {user_id}, "
-                    f"product {product_id}"
-                )
-                
-                # Store in database for processing by next user interaction
-                db.store_pending_auto_recharge_prompt(user_id, product_id)
-
-            return True
-        else:
-            logger.error(
-                f"Failed to complete transaction and add credits for user {user_id}"
-            )
-            return False
-
+        # Try to list a small number of products to test connection
+        stripe.Product.list(limit=1)
+        logger.info("✅ Stripe connection verified successfully")
+        return True
     except Exception as e:
-        logger.error(f"Error processing checkout completed: {e}")
+        logger.error(f"❌ Stripe connection failed: {e}")
+        logger.error("Check your STRIPE_API_KEY configuration")
         return False
 
 
-try:
-    # Try to list a small number of products to test connection
-    stripe.Product.list(limit=1)
-    logger.info("✅ Stripe connection verified successfully")
-except Exception as e:
-    logger.error(f"❌ Stripe connection failed: {e}")
-    logger.error("Check your STRIPE_API_KEY configuration")
+def format_price(amount_cents: int) -> str:
+    """
+    Format price in cents to dollar string.
+
+    Args:
+        amount_cents: Price in cents
+
+    Returns:
+        Formatted price string (e.g., "$12.99")
+    """
+    return f"${amount_cents / 100:.2f}"
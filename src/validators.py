@@ -6,16 +6,48 @@ the bot application to eliminate code duplication and ensure consistent validati
 """
 
 import logging
-import re
+import string
 from typing import Dict, Any, Optional, Union
 from telegram import Update
 from telegram.ext import ContextTypes
 
 from src import database as db
+from src.cache import is_user_banned_cached
 from src.services.error_service import ErrorService, ErrorType
 
 logger = logging.getLogger(__name__)
 
+# Built once; checked on every validated username
+_USERNAME_CHARS = frozenset(string.ascii_letters + string.digits + "_")
+
+# Only passed to ErrorService for logging, never raised, so they can be shared
+_VALIDATE_USER_FAILED = Exception("Failed to validate user")
+_USER_BANNED = Exception("User is banned")
+_INSUFFICIENT_CREDITS = Exception("Insufficient credits")
+
+
+def _validate_int_range(
+    value: Union[str, int], minimum: int = 1, maximum: Optional[int] = None
+) -> tuple[bool, Optional[int]]:
+    """
+    Convert a value to int and check it lies within [minimum, maximum].
+
+    Args:
+        value: Value as string or int
+        minimum: Smallest accepted value
+        maximum: Largest accepted value, or None for no upper bound
+
+    Returns:
+        Tuple of (is_valid, converted_value)
+    """
+    try:
+        number = int(value)
+    except (ValueError, TypeError):
+        return False, None
+    if number < minimum or (maximum is not None and number > maximum):
+        return False, None
+    return True, number
+
 
 class UserValidator:
     """Centralized user validation and creation utilities."""
@@ -73,7 +105,7 @@ class UserValidator:
                     update,
                     context,
                     ErrorType.SYSTEM_ERROR,
-                    Exception("Failed to validate user"),
+                    _VALIDATE_USER_FAILED,
                     "Unable to process your request. Please try again.",
                 )
                 return None
@@ -131,15 +163,8 @@ class UserValidator:
             True if user is banned, False otherwise
         """
         try:
-            user_data = db.get_user(user_id)
-            if user_data and user_data.get("is_banned", False):
-                await ErrorService.handle_error(
-                    update,
-                    context,
-                    ErrorType.USER_ERROR,
-                    Exception("User is banned"),
-                    "Your account has been suspended. Contact support for assistance.",
-                )
+            if is_user_banned_cached(user_id):
+                await UserValidator._notify_banned(update, context)
                 return True
 
             return False
@@ -148,6 +173,19 @@ class UserValidator:
             logger.error(f"Error checking ban status for user {user_id}: {e}")
             return False
 
+    @staticmethod
+    async def _notify_banned(
+        update: Update, context: ContextTypes.DEFAULT_TYPE
+    ) -> None:
+        """Tell a banned user their request was refused."""
+        await ErrorService.handle_error(
+            update,
+            context,
+            ErrorType.USER_ERROR,
+            _USER_BANNED,
+            "Your account has been suspended. Contact support for assistance.",
+        )
+
 
 class InputValidator:
     """Input validation utilities."""
@@ -163,13 +201,7 @@ class InputValidator:
         Returns:
             Tuple of (is_valid, converted_id)
         """
-        try:
-            tid = int(telegram_id)
-            if tid > 0:
-                return True, tid
-            return False, None
-        except (ValueError, TypeError):
-            return False, None
+        return _validate_int_range(telegram_id)
 
     @staticmethod
     def validate_credit_amount(amount: Union[str, int]) -> tuple[bool, Optional[int]]:
@@ -182,13 +214,7 @@ class InputValidator:
         Returns:
             Tuple of (is_valid, converted_amount)
         """
-        try:
-            credit_amount = int(amount)
-            if 1 <= credit_amount <= 10000:  # Reasonable limits
-                return True, credit_amount
-            return False, None
-        except (ValueError, TypeError):
-            return False, None
+        return _validate_int_range(amount, 1, 10000)  # Reasonable limits
 
     @staticmethod
     def validate_product_id(product_id: Union[str, int]) -> tuple[bool, Optional[int]]:
@@ -201,13 +227,7 @@ class InputValidator:
         Returns:
             Tuple of (is_valid, converted_id)
         """
-        try:
-            pid = int(product_id)
-            if pid > 0:
-                return True, pid
-            return False, None
-        except (ValueError, TypeError):
-            return False, None
+        return _validate_int_range(product_id)
 
     @staticmethod
     def sanitize_text_input(text: str, max_length: int = 1000) -> str:
@@ -224,8 +244,8 @@ class InputValidator:
         if not text:
             return ""
 
-        # Remove excessive whitespace
-        text = re.sub(r"\s+", " ", text.strip())
+        # Collapse whitespace runs; split() with no separator strips the ends too
+        text = " ".join(text.split())
 
         # Truncate if too long
         if len(text) > max_length:
@@ -250,8 +270,8 @@ class InputValidator:
         # Remove @ if present
         username = username.lstrip("@")
 
-        # Check format: 5-32 characters, alphanumeric and underscores
-        return bool(re.match(r"^[a-zA-Z0-9_]{5,32}$", username))
+        # Check format: 5-32 characters, ASCII alphanumeric and underscores
+        return 5 <= len(username) <= 32 and _USERNAME_CHARS.issuperset(username)
 
 
 class CallbackDataValidator:
@@ -306,16 +326,16 @@ async def validate_user_and_credits(
     Returns:
         User data if validation passes, None otherwise
     """
-    # Check if user is banned first
-    user = update.effective_user
-    if await UserValidator.check_user_banned(user.id, update, context):
-        return None
-
-    # Validate user exists
+    # Validate user exists; the upserted row also carries the ban flag,
+    # so no separate ban lookup is needed
     user_data = await UserValidator.validate_and_get_user(update, context)
     if not user_data:
         return None
 
+    if user_data.get("is_banned", False):
+        await UserValidator._notify_banned(update, context)
+        return None
+
     # Check credit balance
     is_valid, error_msg = UserValidator.validate_credit_balance(
         user_data, required_credits
@@ -325,7 +345,7 @@ async def validate_user_and_credits(
             update,
             context,
             ErrorType.CREDIT_ERROR,
-            Exception("Insufficient credits"),
+            _INSUFFICIENT_CREDITS,
             error_msg,
         )
         return None
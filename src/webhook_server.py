@@ -5,33 +5,236 @@ This module implements the webhook server using Flask application factory patter
 with proper security, error handling, and monitoring for production deployment.
 """
 
-import logging
+import asyncio
+import hashlib
+import hmac
 import json
+import logging
 import threading
-import os
-from flask import Flask, request, jsonify
-from telegram import Update
+import time
+from typing import Any, Dict, Optional
+from flask import Flask, Response, request, jsonify
+from flask.json.provider import DefaultJSONProvider
+from telegram import Bot, Update
 from telegram.ext import Application
 
-from src.config import WEBHOOK_SECRET_TOKEN, DEBUG_WEBHOOKS
+from src.config import (
+    WEBHOOK_SECRET_TOKEN,
+    DEBUG_WEBHOOKS,
+    FLASK_DEBUG,
+    PORT,
+    STRIPE_API_KEY,
+    STRIPE_STARTUP_PROBE,
+)
 from src.stripe_utils import (
     verify_webhook_signature,
     process_webhook_event,
+    enqueue_webhook_event,
+    drain_webhook_events,
+    check_stripe_connectivity,
     StripeError,
 )
 from src.bot_factory import create_application
+from src.migrate import run_migrations_once
 from src import database as db
 
 # Graceful shutdown
 import atexit
 
+# uvloop is a drop-in, faster event loop; fall back to asyncio where unavailable
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+# orjson parses Telegram update bodies and serializes responses faster than json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
 # Version identifier for deployment verification
 DEPLOYMENT_VERSION = "v2.1.0-fixed-migrations"
 
+# Telegram updates and Stripe events are far below this; larger bodies get a 413
+MAX_WEBHOOK_PAYLOAD_BYTES = 1024 * 1024
+
+# Encoded once so each webhook only encodes the incoming header
+_WEBHOOK_SECRET_BYTES = WEBHOOK_SECRET_TOKEN.encode() if WEBHOOK_SECRET_TOKEN else None
+
+# Fixed acknowledgements returned on every successfully queued webhook
+_JSON_HEADERS = {"Content-Type": "application/json"}
+_OK_RESPONSE = (b'{"status":"ok"}\n', 200, _JSON_HEADERS)
+_QUEUED_RESPONSE = (b'{"status":"queued"}\n', 200, _JSON_HEADERS)
+
+
+def _error_response(message: str, status: int) -> tuple:
+    """
+    Pre-serialize a constant JSON error answer.
+
+    Args:
+        message: Error message for the body
+        status: HTTP status code
+
+    Returns:
+        (body, status, headers) tuple Flask can return directly
+    """
+    body = json.dumps({"error": message}, separators=(",", ":")).encode() + b"\n"
+    return body, status, _JSON_HEADERS
+
+
+# Returned while the Telegram loop is still starting or already shut down;
+# Telegram redelivers the update, so this path can be hit repeatedly
+_TELEGRAM_UNAVAILABLE_RESPONSE = _error_response("Telegram service unavailable", 503)
+
+# Error answers are constant too; rejected requests (bad secrets, junk
+# payloads, scanners hitting unknown paths) get pre-serialized bytes
+_UNAUTHORIZED_RESPONSE = _error_response("Unauthorized", 403)
+_INVALID_JSON_RESPONSE = _error_response("Invalid JSON", 400)
+_EMPTY_PAYLOAD_RESPONSE = _error_response("Empty payload", 400)
+_DESERIALIZATION_FAILED_RESPONSE = _error_response("Update deserialization failed", 400)
+_INVALID_UPDATE_RESPONSE = _error_response("Invalid update format", 400)
+_UPDATE_PROCESSING_FAILED_RESPONSE = _error_response("Update processing failed", 500)
+_INVALID_PAYLOAD_RESPONSE = _error_response("Invalid payload", 400)
+_MISSING_SIGNATURE_RESPONSE = _error_response("Missing signature", 400)
+_INVALID_SIGNATURE_RESPONSE = _error_response("Invalid signature", 403)
+_SIGNATURE_FAILED_RESPONSE = _error_response("Signature verification failed", 400)
+_EVENT_PROCESSING_FAILED_RESPONSE = _error_response("Event processing failed", 500)
+_EVENT_PROCESSING_ERROR_RESPONSE = _error_response("Event processing error", 500)
+_NOT_FOUND_RESPONSE = _error_response("Endpoint not found", 404)
+_METHOD_NOT_ALLOWED_RESPONSE = _error_response("Method not allowed", 405)
+_PAYLOAD_TOO_LARGE_RESPONSE = _error_response("Payload too large", 413)
+_INTERNAL_ERROR_RESPONSE = _error_response("Internal server error", 500)
+_UNEXPECTED_ERROR_RESPONSE = _error_response("An unexpected error occurred", 500)
+
+# The shallow /health answer when every component is up never changes, so
+# probes get pre-serialized bytes instead of a freshly built dict
+_HEALTHY_RESPONSE = json.dumps(
+    {
+        "status": "healthy",
+        "service": "Enterprise Telegram Bot",
+        "components": {
+            "database": "initialized",
+            "telegram_bot": "healthy",
+            "stripe": "configured",
+        },
+    },
+    separators=(",", ":"),
+).encode()
+
+# Landing pages are constant, so encode them once and let browsers cache them
+_STATIC_PAGE_HEADERS = {"Cache-Control": "public, max-age=3600"}
+
+_SUCCESS_HTML = """
+<!DOCTYPE html>
+<html>
+<head>
+    <title>Payment Successful</title>
+    <style>
+        body { font-family: Arial, sans-serif; text-align: center; padding: 50px; }
+        .success { color: #28a745; font-size: 24px; margin-bottom: 20px; }
+        .message { font-size: 18px; margin-bottom: 30px; }
+        .button { 
+            background-color: #007bff; 
+            color: white; 
+            padding: 12px 24px; 
+            text-decoration: none; 
+            border-radius: 5px;
+            display: inline-block;
+        }
+    </style>
+</head>
+<body>
+    <div class="success">✅ Payment Successful!</div>
+    <div class="message">
+        Your purchase has been completed successfully.<br>
+        Your credits have been added to your account.
+    </div>
+    <a href="https://t.me/your_bot_username" class="button">Return to Bot</a>
+</body>
+</html>
+""".encode("utf-8")
+
+_CANCEL_HTML = """
+<!DOCTYPE html>
+<html>
+<head>
+    <title>Payment Cancelled</title>
+    <style>
+        body { font-family: Arial, sans-serif; text-align: center; padding: 50px; }
+        .cancel { color: #dc3545; font-size: 24px; margin-bottom: 20px; }
+        .message { font-size: 18px; margin-bottom: 30px; }
+        .button { 
+            background-color: #007bff; 
+            color: white; 
+            padding: 12px 24px; 
+            text-decoration: none; 
+            border-radius: 5px;
+            display: inline-block;
+        }
+    </style>
+</head>
+<body>
+    <div class="cancel">❌ Payment Cancelled</div>
+    <div class="message">
+        Your payment was cancelled.<br>
+        No charges have been made to your account.
+    </div>
+    <a href="https://t.me/your_bot_username" class="button">Return to Bot</a>
+</body>
+</html>
+""".encode("utf-8")
+
+_BILLING_COMPLETE_HTML = """
+<!DOCTYPE html>
+<html>
+<head>
+    <title>Billing Updated</title>
+    <style>
+        body { font-family: Arial, sans-serif; text-align: center; padding: 50px; }
+        .success { color: #28a745; font-size: 24px; margin-bottom: 20px; }
+        .message { font-size: 18px; margin-bottom: 30px; }
+        .button { 
+            background-color: #007bff; 
+            color: white; 
+            padding: 12px 24px; 
+            text-decoration: none; 
+            border-radius: 5px;
+            display: inline-block;
+        }
+    </style>
+</head>
+<body>
+    <div class="success">✅ Billing Settings Updated</div>
+    <div class="message">
+        Your billing information has been updated successfully.<br>
+        You can now return to the bot to continue.
+    </div>
+    <a href="https://t.me/your_bot_username" class="button">Return to Bot</a>
+</body>
+</html>
+""".encode("utf-8")
+
+# Content hashes let browsers revalidate the pages with a 304
+_SUCCESS_ETAG = hashlib.sha1(_SUCCESS_HTML).hexdigest()
+_CANCEL_ETAG = hashlib.sha1(_CANCEL_HTML).hexdigest()
+_BILLING_COMPLETE_ETAG = hashlib.sha1(_BILLING_COMPLETE_HTML).hexdigest()
+
 # Global variables for application instances
 telegram_app: Application = None
+# Bound once at startup; every webhook update is deserialized against it
+_telegram_bot: Bot = None
+# Bound put_nowait of the application's update queue, scheduled on its loop
+_enqueue_update = None
+
+# Set once the Telegram application has started and can accept updates
+_telegram_ready = threading.Event()
+
+# Event loop and thread that own the Telegram application
+_telegram_loop: Optional[asyncio.AbstractEventLoop] = None
+_telegram_thread: Optional[threading.Thread] = None
 
 
 class WebhookServerError(Exception):
@@ -40,193 +243,125 @@ class WebhookServerError(Exception):
     pass
 
 
-class AsyncLoopManager:
+# Wakes the webhook worker when an event is queued; the timeout also picks
+# up retries and events queued by other workers
+_webhook_wakeup = threading.Event()
+WEBHOOK_POLL_INTERVAL_SECONDS = 30
+WEBHOOK_DRAIN_BATCH_SIZE = 20
+
+# A successful deep Stripe probe is reused for this long so frequent
+# readiness probes don't each make a Stripe API call
+STRIPE_HEALTH_TTL_SECONDS = 30
+_stripe_health_ok_at = float("-inf")
+
+# Rejected requests are logged at most once per reason in this window, so a
+# flood of bad payloads or forged signatures can't turn into a log flood
+REJECTED_REQUEST_LOG_INTERVAL_SECONDS = 10
+_rejected_log_at: Dict[str, float] = {}
+_rejected_suppressed: Dict[str, int] = {}
+
+
+def _static_page_response(body: bytes, etag: str) -> Response:
     """
-    Manages async event loops to prevent memory leaks and multiple loop creation.
-    Implements singleton pattern for centralized loop management.
+    Build a cacheable response for a constant landing page.
+
+    Args:
+        body: Pre-encoded HTML
+        etag: Precomputed hash of the body
+
+    Returns:
+        200 response, or 304 if the browser's copy is current
     """
-    _instance = None
-    _loop = None
-    _thread = None
-    
-    def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super().__new__(cls)
-        return cls._instance
-    
-    def get_or_create_loop(self):
-        """Get existing loop or create new one if needed."""
-        if self._loop is None or self._loop.is_closed():
-            import asyncio
-            self._loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(self._loop)
-        return self._loop
-    
-    def close_loop(self):
-        """Safely close the managed loop."""
-        if self._loop and not self._loop.is_closed():
-            self._loop.close()
-            self._loop = None
-
-# Global loop manager instance
-loop_manager = AsyncLoopManager()
-
-# Migration coordination to prevent concurrent execution across workers
-_migrations_completed = False
-
-
-def _run_migrations_once() -> None:
+    response = Response(body, mimetype="text/html", headers=_STATIC_PAGE_HEADERS)
+    response.set_etag(etag)
+    return response.make_conditional(request)
+
+
+def _stripe_is_healthy() -> bool:
     """
-    Run database migrations only once, even with multiple Gunicorn workers.
-    Uses a database-based lock to prevent race conditions across processes.
+    Check Stripe connectivity, reusing a recent successful probe.
+
+    Returns:
+        True if Stripe responded within the last STRIPE_HEALTH_TTL_SECONDS
+    """
+    global _stripe_health_ok_at
+
+    if time.monotonic() - _stripe_health_ok_at < STRIPE_HEALTH_TTL_SECONDS:
+        return True
+    if check_stripe_connectivity():
+        _stripe_health_ok_at = time.monotonic()
+        return True
+    return False
+
+
+def _log_rejected(reason: str, level: int, message: str, *args: Any) -> None:
+    """
+    Log a rejected webhook request, throttled per rejection reason.
+
+    Args:
+        reason: Key identifying the kind of rejection
+        level: Logging level to use
+        message: %-style log message
+        *args: Arguments for the message
     """
-    global _migrations_completed
-    
-    if _migrations_completed:
-        logger.info("📋 Migrations already completed by this worker")
+    now = time.monotonic()
+    last = _rejected_log_at.get(reason, float("-inf"))
+    if now - last < REJECTED_REQUEST_LOG_INTERVAL_SECONDS:
+        _rejected_suppressed[reason] = _rejected_suppressed.get(reason, 0) + 1
         return
-    
-    try:
-        # Use a simple database table for coordination that's guaranteed to exist
-        migration_lock_acquired = False
-        
+
+    _rejected_log_at[reason] = now
+    suppressed = _rejected_suppressed.pop(reason, 0)
+    if suppressed:
+        message += " (%d similar suppressed)"
+        args += (suppressed,)
+    logger.log(level, message, *args)
+
+
+def _run_webhook_worker() -> None:
+    """Process queued Stripe webhook events in the background."""
+    while True:
+        _webhook_wakeup.wait(timeout=WEBHOOK_POLL_INTERVAL_SECONDS)
+        _webhook_wakeup.clear()
         try:
-            # Try to create a simple coordination table and acquire lock
-            with db.get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    # Create coordination table if it doesn't exist
-                    cursor.execute("""
-                        CREATE TABLE IF NOT EXISTS migration_lock (
-                            id INTEGER PRIMARY KEY DEFAULT 1,
-                            status VARCHAR(20) DEFAULT 'not_started',
-                            worker_pid INTEGER,
-                            started_at TIMESTAMPTZ DEFAULT NOW(),
-                            CHECK (id = 1)
-                        )
-                    """)
-                    
-                    # Try to insert our lock row
-                    try:
-                        cursor.execute("""
-                            INSERT INTO migration_lock (id, status, worker_pid) 
-                            VALUES (1, 'running', %s)
-                        """, (os.getpid(),))
-                        migration_lock_acquired = True
-                        logger.info("🔒 Acquired migration lock")
-                    except Exception:
-                        # Lock row already exists, check status
-                        cursor.execute("SELECT status, worker_pid FROM migration_lock WHERE id = 1")
-                        result = cursor.fetchone()
-                        
-                        if result:
-                            current_status = result['status']
-                            
-                            if current_status == 'completed':
-                                logger.info("📋 Migrations already completed by another worker")
-                                _migrations_completed = True
-                                return
-                            elif current_status == 'running':
-                                logger.info("📋 Migrations currently running in another worker, skipping...")
-                                return
-                        
-                        # Try to update to running if status is failed or not_started
-                        cursor.execute("""
-                            UPDATE migration_lock 
-                            SET status = 'running', worker_pid = %s, started_at = NOW()
-                            WHERE id = 1 AND status IN ('not_started', 'failed')
-                        """, (os.getpid(),))
-                        
-                        if cursor.rowcount > 0:
-                            migration_lock_acquired = True
-                            logger.info("🔒 Acquired migration lock after cleanup")
-                        else:
-                            logger.info("📋 Another worker is handling migrations")
-                            return
-                    
-                    conn.commit()
-                    
-        except Exception as lock_error:
-            logger.warning(f"Could not acquire migration lock: {lock_error}")
-            # Continue anyway for now, but with caution
-                
-        logger.info("🔧 Running database migrations (process-safe)...")
-        logger.info(f"🚀 Deployment version: {DEPLOYMENT_VERSION}")
-        
+            # Keep draining while full batches come back; a short batch means
+            # the due events are done and the rest wait for their backoff
+            batch_size = WEBHOOK_DRAIN_BATCH_SIZE
+            while drain_webhook_events(batch_size) == batch_size:
+                pass
+        except Exception as e:
+            logger.error(f"Webhook worker error: {e}")
+
+
+def start_webhook_worker() -> None:
+    """Start the background thread that drains the webhook event queue."""
+    worker_thread = threading.Thread(
+        target=_run_webhook_worker, name="webhook-worker", daemon=True
+    )
+    worker_thread.start()
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider backed by orjson.
+
+    Falls back to the default provider for values orjson cannot serialize
+    (e.g. Decimal) so responses never fail on the faster path.
+    """
+
+    def dumps(self, obj, **kwargs) -> str:
+        """Serialize obj to a JSON string."""
+        option = orjson.OPT_SORT_KEYS if kwargs.get("sort_keys") else 0
+        if kwargs.get("indent"):
+            option |= orjson.OPT_INDENT_2
         try:
-            # Apply database migrations with better error handling
-            logger.info("📝 Applying conversation table fix...")
-            db.apply_conversation_table_fix()
-            
-            # Apply enhanced UX migration
-            logger.info("📝 Applying enhanced UX migration...")
-            db.apply_enhanced_ux_migration()
-            
-            # Apply unread tracking migration
-            logger.info("📝 Applying unread tracking migration...")
-            db.apply_unread_tracking_migration()
-            
-            # Apply conversations updated_at fix
-            logger.info("📝 Applying conversations updated_at fix...")
-            db.apply_conversations_updated_at_fix()
-            
-            # Apply database views and functions
-            logger.info("📝 Applying database views and functions...")
-            db.apply_database_views_and_functions()
-            
-            # Clean up any problematic indexes first
-            logger.info("📝 Cleaning problematic indexes...")
-            db.clean_problematic_indexes()
-            
-            # Apply performance indexes migration
-            logger.info("📝 Applying performance indexes migration...")
-            db.apply_performance_indexes_migration()
-            
-            # Apply message references table migration
-            logger.info("📝 Applying message references table migration...")
-            db.apply_message_references_table_migration()
-            
-            # Mark migrations as completed
-            if migration_lock_acquired:
-                try:
-                    with db.get_db_connection() as conn:
-                        with conn.cursor() as cursor:
-                            cursor.execute("""
-                                UPDATE migration_lock 
-                                SET status = 'completed', started_at = NOW()
-                                WHERE id = 1
-                            """)
-                            conn.commit()
-                except Exception as e:
-                    logger.warning(f"Could not update migration status: {e}")
-            
-            _migrations_completed = True
-            logger.info("✅ All database migrations completed successfully")
-            
-        except Exception as migration_error:
-            logger.error(f"❌ Migration failed: {migration_error}")
-            
-            # Reset migration status on failure
-            if migration_lock_acquired:
-                try:
-                    with db.get_db_connection() as conn:
-                        with conn.cursor() as cursor:
-                            cursor.execute("""
-                                UPDATE migration_lock 
-                                SET status = 'failed', started_at = NOW()
-                                WHERE id = 1
-                            """)
-                            conn.commit()
-                except Exception:
-                    pass  # Don't fail on cleanup failure
-            
-            # Re-raise to prevent app from starting with broken state
-            raise
-            
-    except Exception as e:
-        logger.error(f"❌ Migration coordination failed: {e}")
-        # Don't prevent app startup for coordination failures unless it's a migration error
-        if "migration" in str(e).lower():
-            raise
+            return orjson.dumps(obj, option=option).decode()
+        except TypeError:
+            return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        """Deserialize a JSON string or bytes."""
+        return orjson.loads(s)
 
 
 def create_flask_app() -> Flask:
@@ -237,6 +372,9 @@ def create_flask_app() -> Flask:
         Configured Flask application
     """
     app = Flask(__name__)
+    app.config["MAX_CONTENT_LENGTH"] = MAX_WEBHOOK_PAYLOAD_BYTES
+    if orjson is not None:
+        app.json = OrjsonProvider(app)
 
     # Configure logging for production
     if not app.debug:
@@ -245,28 +383,21 @@ def create_flask_app() -> Flask:
         )
 
     # Initialize database connection pool
-    from src.database import init_connection_pool
-
-    init_connection_pool()
-
-    # Apply database migrations with lock to prevent concurrent execution
-    _run_migrations_once()
-
-    # Ensure we have sample products for testing
-    logger.info("🛍️ Ensuring sample products exist...")
-    db.ensure_sample_products()
-    logger.info("✅ Product setup completed")
-
-    # Initialize and START Telegram application immediately
-    global telegram_app
-    
-    # Create and initialize the Telegram application using managed loop
-    def initialize_telegram_app():
-        loop = loop_manager.get_or_create_loop()
-        telegram_app = loop.run_until_complete(create_application())
-        return telegram_app
-    
-    telegram_app = initialize_telegram_app()
+    db.init_connection_pool()
+
+    # Normally a no-op: the release step (python -m src.migrate) has already
+    # brought the schema up to date, so this is a single version check
+    logger.info(f"🚀 Deployment version: {DEPLOYMENT_VERSION}")
+    run_migrations_once()
+
+    start_webhook_worker()
+
+    # A Stripe round-trip per worker slows cold starts; opt in, or use
+    # /health?deep=1 from a readiness probe instead
+    if STRIPE_STARTUP_PROBE:
+        check_stripe_connectivity()
+
+    # Create and START Telegram application immediately
     start_telegram_application()
 
     # Register routes
@@ -293,61 +424,72 @@ def register_routes(app: Flask) -> None:
         Returns:
             JSON response with status
         """
-        try:
-            # Telegram app is already started in create_flask_app()
-            global telegram_app
-            if not telegram_app or not hasattr(telegram_app, "bot"):
-                logger.error("Telegram app not initialized")
-                return jsonify({"error": "Telegram service unavailable"}), 503
-
-            # Verify webhook secret token if configured
-            if WEBHOOK_SECRET_TOKEN:
-                auth_header = request.headers.get("X-Telegram-Bot-Api-Secret-Token")
-                if auth_header != WEBHOOK_SECRET_TOKEN:
-                    logger.warning(
-                        f"Invalid webhook secret token from {request.remote_addr}"
-                    )
-                    return jsonify({"error": "Unauthorized"}), 403
-
-            # Get raw JSON data
-            try:
-                update_dict = request.get_json(force=True)
-                if not update_dict:
-                    logger.error("Empty webhook payload received")
-                    return jsonify({"error": "Empty payload"}), 400
-            except Exception as e:
-                logger.error(f"Failed to parse webhook JSON: {e}")
-                return jsonify({"error": "Invalid JSON"}), 400
-
-            # Debug logging if enabled
-            if DEBUG_WEBHOOKS:
-                logger.debug(
-                    f"Telegram webhook data: {json.dumps(update_dict, indent=2)}"
+        # Telegram app is started in create_flask_app()
+        if not _telegram_ready.is_set():
+            logger.error("Telegram app not initialized")
+            return _TELEGRAM_UNAVAILABLE_RESPONSE
+
+        # Verify webhook secret token if configured
+        if _WEBHOOK_SECRET_BYTES:
+            auth_header = request.headers.get(
+                "X-Telegram-Bot-Api-Secret-Token", ""
+            ).encode()
+            if not hmac.compare_digest(auth_header, _WEBHOOK_SECRET_BYTES):
+                _log_rejected(
+                    "telegram_secret",
+                    logging.WARNING,
+                    "Invalid webhook secret token from %s",
+                    request.remote_addr,
                 )
+                return _UNAUTHORIZED_RESPONSE
 
-            # Create Update object
-            try:
-                update = Update.de_json(update_dict, telegram_app.bot)
-                if not update:
-                    logger.error("Failed to create Update object")
-                    return jsonify({"error": "Invalid update format"}), 400
-            except Exception as e:
-                logger.error(f"Failed to deserialize update: {e}")
-                return jsonify({"error": "Update deserialization failed"}), 400
-
-            # Process update asynchronously
-            try:
-                telegram_app.update_queue.put_nowait(update)
-                logger.info(f"✅ Telegram update queued: {update.update_id}")
-            except Exception as e:
-                logger.error(f"Failed to queue update: {e}")
-                return jsonify({"error": "Update processing failed"}), 500
-
-            return jsonify({"status": "ok"}), 200
-
+        # Read the body once and parse it with the app's JSON provider; the
+        # raw bytes are reused for debug logging
+        body = request.get_data(cache=False)
+        try:
+            update_dict = app.json.loads(body) if body else None
+        except ValueError as e:
+            # Covers json/orjson decode errors and invalid UTF-8
+            _log_rejected(
+                "telegram_json", logging.ERROR, "Failed to parse webhook JSON: %s", e
+            )
+            return _INVALID_JSON_RESPONSE
+        if not update_dict:
+            _log_rejected(
+                "telegram_empty", logging.ERROR, "Empty webhook payload received"
+            )
+            return _EMPTY_PAYLOAD_RESPONSE
+
+        if DEBUG_WEBHOOKS and logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Telegram webhook data: %s", body.decode("utf-8", "replace"))
+
+        # Create Update object
+        try:
+            update = Update.de_json(update_dict, _telegram_bot)
+        except Exception as e:
+            _log_rejected(
+                "telegram_update",
+                logging.ERROR,
+                "Failed to deserialize update: %s",
+                e,
+            )
+            return _DESERIALIZATION_FAILED_RESPONSE
+        if not update:
+            _log_rejected(
+                "telegram_update", logging.ERROR, "Failed to create Update object"
+            )
+            return _INVALID_UPDATE_RESPONSE
+
+        # Hand the update to the Telegram loop thread; asyncio queues are not
+        # thread-safe, and call_soon_threadsafe wakes the consumer right away
+        try:
+            _telegram_loop.call_soon_threadsafe(_enqueue_update, update)
+            logger.info("✅ Telegram update queued: %s", update.update_id)
         except Exception as e:
-            logger.error(f"Telegram webhook error: {e}")
-            return jsonify({"error": "Internal server error"}), 500
+            logger.error(f"Failed to queue update: {e}")
+            return _UPDATE_PROCESSING_FAILED_RESPONSE
+
+        return _OK_RESPONSE
 
     @app.route("/stripe-webhook", methods=["POST"])
     def stripe_webhook():
@@ -358,55 +500,76 @@ def register_routes(app: Flask) -> None:
         Returns:
             JSON response with status
         """
+        # Get raw payload and signature; the body is only needed here, so skip
+        # Werkzeug's cached copy and decode it once for verification, parsing,
+        # logging and the event queue
         try:
-            # Get raw payload and signature
-            payload = request.get_data()
-            signature = request.headers.get("Stripe-Signature")
-
-            if not payload:
-                logger.error("Empty Stripe webhook payload")
-                return jsonify({"error": "Empty payload"}), 400
-
-            if not signature:
-                logger.error("Missing Stripe signature header")
-                return jsonify({"error": "Missing signature"}), 400
-
-            # CRITICAL: Verify webhook signature first
-            try:
-                event = verify_webhook_signature(payload, signature)
-                logger.info(
-                    f"✅ Stripe webhook verified: {event['type']} - {event['id']}"
-                )
-            except StripeError as e:
-                logger.error(f"Stripe signature verification failed: {e}")
-                if "Invalid signature" in str(e):
-                    return jsonify({"error": "Invalid signature"}), 403
-                else:
-                    return jsonify({"error": "Signature verification failed"}), 400
-
-            # Debug logging if enabled
-            if DEBUG_WEBHOOKS:
-                logger.debug(
-                    f"Stripe webhook event: {json.dumps(event, indent=2, default=str)}"
-                )
-
-            # Process the verified event
-            try:
-                success = process_webhook_event(event)
-                if success:
-                    logger.info(f"✅ Stripe event processed: {event['type']}")
-                    return jsonify({"status": "success"}), 200
-                else:
-                    logger.error(f"Failed to process Stripe event: {event['type']}")
-                    return jsonify({"error": "Event processing failed"}), 500
+            payload = request.get_data(cache=False).decode("utf-8")
+        except UnicodeDecodeError:
+            _log_rejected(
+                "stripe_payload",
+                logging.ERROR,
+                "Stripe webhook payload is not valid UTF-8",
+            )
+            return _INVALID_PAYLOAD_RESPONSE
+        signature = request.headers.get("Stripe-Signature")
+
+        if not payload:
+            _log_rejected(
+                "stripe_payload", logging.ERROR, "Empty Stripe webhook payload"
+            )
+            return _EMPTY_PAYLOAD_RESPONSE
+
+        if not signature:
+            _log_rejected(
+                "stripe_signature", logging.ERROR, "Missing Stripe signature header"
+            )
+            return _MISSING_SIGNATURE_RESPONSE
+
+        # CRITICAL: Verify webhook signature first
+        try:
+            event = verify_webhook_signature(payload, signature)
+            logger.info(f"✅ Stripe webhook verified: {event['type']} - {event['id']}")
+        except StripeError as e:
+            _log_rejected(
+                "stripe_signature",
+                logging.ERROR,
+                "Stripe signature verification failed: %s",
+                e,
+            )
+            if "Invalid signature" in str(e):
+                return _INVALID_SIGNATURE_RESPONSE
+            else:
+                return _SIGNATURE_FAILED_RESPONSE
+
+        # Debug logging if enabled; skips decoding the body when DEBUG is off
+        if DEBUG_WEBHOOKS and logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Stripe webhook event: %s", payload)
+
+        # Queue the event and acknowledge right away so slow handlers
+        # don't push Stripe into retrying
+        try:
+            if enqueue_webhook_event(event, payload):
+                _webhook_wakeup.set()
+            else:
+                logger.info(f"Duplicate Stripe event ignored: {event['id']}")
+            return _QUEUED_RESPONSE
+        except Exception as e:
+            logger.error(f"Could not queue Stripe event {event['id']}: {e}")
 
-            except Exception as e:
-                logger.error(f"Error processing Stripe event {event['type']}: {e}")
-                return jsonify({"error": "Event processing error"}), 500
+        # Queue unavailable: process inline as before
+        try:
+            success = process_webhook_event(event)
+            if success:
+                logger.info(f"✅ Stripe event processed: {event['type']}")
+                return jsonify({"status": "success"}), 200
+            else:
+                logger.error(f"Failed to process Stripe event: {event['type']}")
+                return _EVENT_PROCESSING_FAILED_RESPONSE
 
         except Exception as e:
-            logger.error(f"Stripe webhook error: {e}")
-            return jsonify({"error": "Internal server error"}), 500
+            logger.error(f"Error processing Stripe event {event['type']}: {e}")
+            return _EVENT_PROCESSING_ERROR_RESPONSE
 
     @app.route("/", methods=["GET"])
     def root():
@@ -418,10 +581,17 @@ def register_routes(app: Flask) -> None:
         """
         Health check endpoint for monitoring.
         Tests database connectivity and basic service health.
+        With ?deep=1, also verifies the database and calls the Stripe API.
 
         Returns:
             JSON response with health status
         """
+        deep = request.args.get("deep") == "1"
+        connection_pool = db.connection_pool
+        telegram_ready = _telegram_ready.is_set()
+        if not deep and connection_pool and telegram_ready and STRIPE_API_KEY:
+            return Response(_HEALTHY_RESPONSE, mimetype="application/json")
+
         try:
             health_status = {
                 "status": "healthy",
@@ -431,19 +601,22 @@ def register_routes(app: Flask) -> None:
 
             # Test database connectivity (non-blocking)
             try:
-                from src.database import connection_pool
-
-                if connection_pool:
+                if not connection_pool:
+                    health_status["components"]["database"] = "not_initialized"
+                elif not deep:
                     health_status["components"]["database"] = "initialized"
+                elif db.pool_is_healthy():
+                    health_status["components"]["database"] = "healthy"
                 else:
-                    health_status["components"]["database"] = "not_initialized"
+                    health_status["components"]["database"] = "unhealthy"
+                    health_status["status"] = "degraded"
             except Exception as e:
                 logger.error(f"Database health check failed: {e}")
                 health_status["components"]["database"] = "error"
 
             # Test Telegram bot connection
             try:
-                if telegram_app and telegram_app.bot:
+                if telegram_ready:
                     health_status["components"]["telegram_bot"] = "healthy"
                 else:
                     health_status["components"]["telegram_bot"] = "not_initialized"
@@ -455,12 +628,15 @@ def register_routes(app: Flask) -> None:
 
             # Test Stripe connection (non-blocking)
             try:
-                from src.config import STRIPE_API_KEY
-
-                if STRIPE_API_KEY:
+                if not STRIPE_API_KEY:
+                    health_status["components"]["stripe"] = "not_configured"
+                elif not deep:
                     health_status["components"]["stripe"] = "configured"
+                elif _stripe_is_healthy():
+                    health_status["components"]["stripe"] = "healthy"
                 else:
-                    health_status["components"]["stripe"] = "not_configured"
+                    health_status["components"]["stripe"] = "unhealthy"
+                    health_status["status"] = "degraded"
             except Exception as e:
                 logger.error(f"Stripe health check failed: {e}")
                 health_status["components"]["stripe"] = "error"
@@ -481,35 +657,7 @@ def register_routes(app: Flask) -> None:
         session_id = request.args.get("session_id")
         logger.info(f"Payment success page accessed with session: {session_id}")
 
-        return """
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <title>Payment Successful</title>
-            <style>
-                body { font-family: Arial, sans-serif; text-align: center; padding: 50px; }
-                .success { color: #28a745; font-size: 24px; margin-bottom: 20px; }
-                .message { font-size: 18px; margin-bottom: 30px; }
-                .button { 
-                    background-color: #007bff; 
-                    color: white; 
-                    padding: 12px 24px; 
-                    text-decoration: none; 
-                    border-radius: 5px;
-                    display: inline-block;
-                }
-            </style>
-        </head>
-        <body>
-            <div class="success">✅ Payment Successful!</div>
-            <div class="message">
-                Your purchase has been completed successfully.<br>
-                Your credits have been added to your account.
-            </div>
-            <a href="https://t.me/your_bot_username" class="button">Return to Bot</a>
-        </body>
-        </html>
-        """
+        return _static_page_response(_SUCCESS_HTML, _SUCCESS_ETAG)
 
     @app.route("/cancel")
     def payment_cancel():
@@ -519,35 +667,7 @@ def register_routes(app: Flask) -> None:
         """
         logger.info("Payment cancel page accessed")
 
-        return """
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <title>Payment Cancelled</title>
-            <style>
-                body { font-family: Arial, sans-serif; text-align: center; padding: 50px; }
-                .cancel { color: #dc3545; font-size: 24px; margin-bottom: 20px; }
-                .message { font-size: 18px; margin-bottom: 30px; }
-                .button { 
-                    background-color: #007bff; 
-                    color: white; 
-                    padding: 12px 24px; 
-                    text-decoration: none; 
-                    border-radius: 5px;
-                    display: inline-block;
-                }
-            </style>
-        </head>
-        <body>
-            <div class="cancel">❌ Payment Cancelled</div>
-            <div class="message">
-                Your payment was cancelled.<br>
-                No charges have been made to your account.
-            </div>
-            <a href="https://t.me/your_bot_username" class="button">Return to Bot</a>
-        </body>
-        </html>
-        """
+        return _static_page_response(_CANCEL_HTML, _CANCEL_ETAG)
 
     @app.route("/billing-complete")
     def billing_complete():
@@ -557,35 +677,7 @@ def register_routes(app: Flask) -> None:
         """
         logger.info("Billing complete page accessed")
 
-        return """
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <title>Billing Updated</title>
-            <style>
-                body { font-family: Arial, sans-serif; text-align: center; padding: 50px; }
-                .success { color: #28a745; font-size: 24px; margin-bottom: 20px; }
-                .message { font-size: 18px; margin-bottom: 30px; }
-                .button { 
-                    background-color: #007bff; 
-                    color: white; 
-                    padding: 12px 24px; 
-                    text-decoration: none; 
-                    border-radius: 5px;
-                    display: inline-block;
-                }
-            </style>
-        </head>
-        <body>
-            <div class="success">✅ Billing Settings Updated</div>
-            <div class="message">
-                Your billing information has been updated successfully.<br>
-                You can now return to the bot to continue.
-            </div>
-            <a href="https://t.me/your_bot_username" class="button">Return to Bot</a>
-        </body>
-        </html>
-        """
+        return _static_page_response(_BILLING_COMPLETE_HTML, _BILLING_COMPLETE_ETAG)
 
 
 def register_error_handlers(app: Flask) -> None:
@@ -600,25 +692,31 @@ def register_error_handlers(app: Flask) -> None:
     def not_found(error):
         """Handle 404 errors."""
         logger.warning(f"404 Not Found: {request.url}")
-        return jsonify({"error": "Endpoint not found"}), 404
+        return _NOT_FOUND_RESPONSE
 
     @app.errorhandler(405)
     def method_not_allowed(error):
         """Handle 405 Method Not Allowed errors."""
         logger.warning(f"405 Method Not Allowed: {request.method} {request.url}")
-        return jsonify({"error": "Method not allowed"}), 405
+        return _METHOD_NOT_ALLOWED_RESPONSE
+
+    @app.errorhandler(413)
+    def payload_too_large(error):
+        """Handle 413 Payload Too Large errors."""
+        logger.warning(f"413 Payload Too Large: {request.method} {request.url}")
+        return _PAYLOAD_TOO_LARGE_RESPONSE
 
     @app.errorhandler(500)
     def internal_error(error):
         """Handle 500 Internal Server Error."""
         logger.error(f"500 Internal Server Error: {error}")
-        return jsonify({"error": "Internal server error"}), 500
+        return _INTERNAL_ERROR_RESPONSE
 
     @app.errorhandler(Exception)
     def handle_exception(e):
         """Handle all unhandled exceptions."""
         logger.error(f"Unhandled exception: {e}", exc_info=True)
-        return jsonify({"error": "An unexpected error occurred"}), 500
+        return _UNEXPECTED_ERROR_RESPONSE
 
 
 # =============================================================================
@@ -628,55 +726,55 @@ def register_error_handlers(app: Flask) -> None:
 
 def start_telegram_application() -> None:
     """
-    Start the Telegram application for processing updates.
-    Should be called when the Flask app starts.
+    Create and start the Telegram application on its own event loop thread.
+    Should be called when the Flask app starts. Blocks until the application
+    has been created, so failures surface during app startup.
     """
-    global telegram_app
-    if telegram_app:
-        try:
-            # Create a background task to process the update queue  
-            def run_telegram_app():
-                import asyncio
-
-                loop = loop_manager.get_or_create_loop()
-                
-                async def process_updates():
-                    await telegram_app.initialize()
-                    await telegram_app.start()
-                    logger.info(
-                        "✅ Telegram application started and processing updates"
-                    )
-
-                    # Process updates from the queue continuously
-                    while True:
-                        try:
-                            # Get update from queue with timeout
-                            update = await asyncio.wait_for(
-                                telegram_app.update_queue.get(), timeout=1.0
-                            )
-
-                            # Process the update
-                            await telegram_app.process_update(update)
-
-                        except asyncio.TimeoutError:
-                            # No update received, continue loop
-                            continue
-                        except Exception as e:
-                            logger.error(f"Error processing update: {e}")
-                            continue
-
-                try:
-                    loop.run_until_complete(process_updates())
-                except Exception as e:
-                    logger.error(f"Telegram app error: {e}")
-
-            # Start in background thread
-            telegram_thread = threading.Thread(target=run_telegram_app, daemon=True)
-            telegram_thread.start()
+    global _telegram_thread
+    created = threading.Event()
+    errors = []
+
+    def run_telegram_app():
+        global telegram_app, _telegram_bot, _telegram_loop, _enqueue_update
 
+        async def start_application():
+            await telegram_app.initialize()
+            await telegram_app.start()
+            _telegram_ready.set()
+            logger.info("✅ Telegram application started and processing updates")
+
+        loop_factory = uvloop.new_event_loop if uvloop is not None else None
+        try:
+            # The runner owns the loop for the thread's lifetime and closes it,
+            # including async generators and the default executor, on exit
+            with asyncio.Runner(loop_factory=loop_factory) as runner:
+                _telegram_loop = runner.get_loop()
+                telegram_app = runner.run(create_application())
+                _telegram_bot = telegram_app.bot
+                _enqueue_update = telegram_app.update_queue.put_nowait
+                created.set()
+
+                # start() runs the application's own update fetcher, which
+                # honours concurrent_updates; keep the loop alive for it
+                runner.run(start_application())
+                _telegram_loop.run_forever()
         except Exception as e:
-            logger.error(f"Failed to start Telegram application: {e}")
-            raise
+            logger.error(f"Telegram app error: {e}")
+            errors.append(e)
+        finally:
+            created.set()
+
+    _telegram_thread = threading.Thread(
+        target=run_telegram_app, name="telegram-loop", daemon=True
+    )
+    _telegram_thread.start()
+    created.wait()
+
+    if telegram_app is None:
+        logger.error(f"Failed to start Telegram application: {errors[0]}")
+        raise WebhookServerError(
+            f"Failed to create Telegram application: {errors[0]}"
+        )
 
 
 def shutdown_telegram_application() -> None:
@@ -684,21 +782,26 @@ def shutdown_telegram_application() -> None:
     Shutdown the Telegram application gracefully.
     Should be called when the Flask app shuts down.
     """
-    global telegram_app
-    if telegram_app:
-        try:
-            loop = loop_manager.get_or_create_loop()
+    loop = _telegram_loop
+    if telegram_app is None or loop is None or not loop.is_running():
+        return
 
-            # Run async shutdown operations
-            loop.run_until_complete(telegram_app.stop())
-            loop.run_until_complete(telegram_app.shutdown())
-            
-            # Close the managed loop
-            loop_manager.close_loop()
+    _telegram_ready.clear()
+    try:
+        # The application lives on the Telegram thread's loop; stop it there
+        if telegram_app.running:
+            asyncio.run_coroutine_threadsafe(telegram_app.stop(), loop).result(
+                timeout=10
+            )
+        asyncio.run_coroutine_threadsafe(telegram_app.shutdown(), loop).result(
+            timeout=10
+        )
+        loop.call_soon_threadsafe(loop.stop)
+        _telegram_thread.join(timeout=5)
 
-            logger.info("✅ Telegram application shutdown complete")
-        except Exception as e:
-            logger.error(f"Error shutting down Telegram application: {e}")
+        logger.info("✅ Telegram application shutdown complete")
+    except Exception as e:
+        logger.error(f"Error shutting down Telegram application: {e}")
 
 
 # Graceful shutdown
@@ -715,8 +818,6 @@ if __name__ == "__main__":
     Development server entry point.
     For production, use Gunicorn instead.
     """
-    from src.config import PORT, FLASK_DEBUG
-
     logger.info("🚀 Starting Enterprise Telegram Bot Webhook Server")
     logger.info(f"Debug mode: {FLASK_DEBUG}")
     logger.info(f"Port: {PORT}")
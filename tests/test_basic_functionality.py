@@ -28,6 +28,21 @@ class TestBasicFunctionality(unittest.IsolatedAsyncioTestCase):
         except ImportError as e:
             self.fail(f"Config import failed: {e}")
 
+    def test_db_pool_size_is_per_worker(self):
+        """Test that the pool size follows threads, not the worker count."""
+        from unittest.mock import patch
+
+        from src import config
+
+        with patch.multiple(
+            config, GUNICORN_WORKERS=8, GUNICORN_THREADS=2, DB_POOL_MAX_CONN=None
+        ):
+            self.assertEqual(
+                config.get_db_pool_size(), 2 + config.DB_POOL_BACKGROUND_CONN
+            )
+        with patch.multiple(config, GUNICORN_THREADS=2, DB_POOL_MAX_CONN=20):
+            self.assertEqual(config.get_db_pool_size(), 20)
+
     def test_database_import(self):
         """Test that database module can be imported."""
         try:
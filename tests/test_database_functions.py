@@ -7,7 +7,7 @@ These tests verify database operations work correctly.
 import unittest
 import sys
 import os
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
 # Add project root to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -110,6 +110,88 @@ class TestDatabaseFunctions(unittest.TestCase):
         self.assertEqual(result[0]["credits"], 10)
         mock_execute.assert_called_once()
 
+    @patch("src.database.get_db_connection")
+    def test_complete_transaction_and_add_credits(self, mock_connection):
+        """Test transaction completion and credit grant share one connection."""
+        from src import database as db
+
+        cursor = MagicMock()
+        cursor.fetchone.return_value = {"id": "txn-1"}
+        cursor.rowcount = 1
+        conn = mock_connection.return_value.__enter__.return_value
+        conn.cursor.return_value.__enter__.return_value = cursor
+
+        result = db.complete_transaction_and_add_credits(
+            user_id=self.test_user_id, transaction_id="txn-1", credits_granted=10
+        )
+
+        self.assertTrue(result)
+        mock_connection.assert_called_once()
+        self.assertEqual(cursor.execute.call_count, 2)
+
+    @patch("src.database.get_db_connection")
+    def test_complete_transaction_stores_prompt_atomically(self, mock_connection):
+        """Test the auto-recharge prompt is written in the same transaction."""
+        from src import database as db
+
+        cursor = MagicMock()
+        cursor.fetchone.return_value = {"id": "txn-1"}
+        cursor.rowcount = 1
+        conn = mock_connection.return_value.__enter__.return_value
+        conn.cursor.return_value.__enter__.return_value = cursor
+
+        db.complete_transaction_and_add_credits(
+            user_id=self.test_user_id,
+            transaction_id="txn-1",
+            credits_granted=10,
+            auto_recharge_prompt_product_id=2,
+        )
+
+        mock_connection.assert_called_once()
+        self.assertEqual(cursor.execute.call_count, 3)
+        self.assertEqual(
+            cursor.execute.call_args.args[1][0],
+            f"pending_auto_recharge_prompt_{self.test_user_id}",
+        )
+
+    @patch("src.database.get_db_connection")
+    def test_complete_transaction_skips_processed(self, mock_connection):
+        """Test an already completed transaction does not grant credits again."""
+        from src import database as db
+
+        cursor = MagicMock()
+        cursor.fetchone.side_effect = [None, {"status": "completed"}]
+        conn = mock_connection.return_value.__enter__.return_value
+        conn.cursor.return_value.__enter__.return_value = cursor
+
+        result = db.complete_transaction_and_add_credits(
+            user_id=self.test_user_id, transaction_id="txn-1", credits_granted=10
+        )
+
+        self.assertTrue(result)
+        self.assertEqual(cursor.execute.call_count, 2)
+        self.assertNotIn("UPDATE users", cursor.execute.call_args.args[0])
+
+    @patch("src.database.get_db_connection")
+    def test_complete_transaction_fails_for_unknown_transaction(self, mock_connection):
+        """Test a missing or non-pending transaction is reported as a failure."""
+        from src import database as db
+
+        cursor = MagicMock()
+        conn = mock_connection.return_value.__enter__.return_value
+        conn.cursor.return_value.__enter__.return_value = cursor
+
+        for row in (None, {"status": "failed"}):
+            cursor.fetchone.side_effect = [None, row]
+            with self.assertLogs("src.database", level="ERROR"):
+                self.assertFalse(
+                    db.complete_transaction_and_add_credits(
+                        user_id=self.test_user_id,
+                        transaction_id="txn-1",
+                        credits_granted=10,
+                    )
+                )
+
     def test_database_connection_context_manager(self):
         """Test that database connection context manager exists."""
         from src import database as db
@@ -136,6 +218,177 @@ class TestDatabaseUtilities(unittest.TestCase):
         self.assertTrue(hasattr(db, "create_conversation_topic"))
         self.assertTrue(hasattr(db, "get_user_id_from_topic"))
 
+    @patch("src.database.execute_query")
+    def test_pool_is_healthy_skips_probe_after_recent_success(self, mock_execute):
+        """Test a recent successful transaction avoids a SELECT 1 round-trip."""
+        from src import database as db
+
+        pool = MagicMock(closed=False)
+        with patch.object(db, "connection_pool", pool):
+            with patch.object(db, "_last_db_success", float("-inf")):
+                self.assertTrue(db.pool_is_healthy())
+                mock_execute.assert_called_once_with("SELECT 1", fetch_one=True)
+
+            mock_execute.reset_mock()
+            with patch.object(db, "_last_db_success", db.time.monotonic()):
+                self.assertTrue(db.pool_is_healthy())
+                mock_execute.assert_not_called()
+
+            mock_execute.side_effect = db.DatabaseError("down")
+            with patch.object(db, "_last_db_success", float("-inf")):
+                self.assertFalse(db.pool_is_healthy())
+
+        with patch.object(db, "connection_pool", None):
+            self.assertFalse(db.pool_is_healthy())
+
+    @patch("src.database.execute_query")
+    def test_get_schema_version(self, mock_execute):
+        """Test the recorded schema version, defaulting to 0 when missing."""
+        from src import database as db
+
+        mock_execute.return_value = {"value": 9}
+        self.assertEqual(db.get_schema_version(), 9)
+
+        mock_execute.return_value = None
+        self.assertEqual(db.get_schema_version(), 0)
+
+        mock_execute.side_effect = db.DatabaseError("no such table")
+        self.assertEqual(db.get_schema_version(), 0)
+
+    @patch("src.database.psycopg2.connect")
+    def test_advisory_lock_releases_on_error(self, mock_connect):
+        """Test the advisory lock is released and its connection closed."""
+        from src import database as db
+
+        conn = mock_connect.return_value
+        cursor = conn.cursor.return_value.__enter__.return_value
+
+        with self.assertRaises(RuntimeError):
+            with db.advisory_lock(42) as lock_conn:
+                self.assertIs(lock_conn, conn)
+                raise RuntimeError("migration failed")
+
+        self.assertTrue(conn.autocommit)
+        self.assertEqual(
+            [c.args for c in cursor.execute.call_args_list],
+            [
+                ("SELECT pg_advisory_lock(%s)", (42,)),
+                ("SELECT pg_advisory_unlock(%s)", (42,)),
+            ],
+        )
+        conn.close.assert_called_once()
+
+    @patch("src.database.execute_query")
+    def test_finish_webhook_event_backs_off_retries(self, mock_execute):
+        """Test failed events are rescheduled with growing delays, then failed."""
+        from src import database as db
+
+        self.assertEqual(db.finish_webhook_event(1, False, 1), "pending")
+        self.assertEqual(
+            mock_execute.call_args.args[1], ("pending", "pending", 60, "pending", 1)
+        )
+
+        self.assertEqual(db.finish_webhook_event(1, False, 3), "pending")
+        self.assertEqual(mock_execute.call_args.args[1][2], 960)
+
+        self.assertEqual(db.finish_webhook_event(1, False, 5), "failed")
+        self.assertEqual(db.finish_webhook_event(1, True, 2), "done")
+
+
+class TestCachedLookups(unittest.TestCase):
+    """Test cached database lookups."""
+
+    def setUp(self):
+        from src.cache import cache
+
+        cache.clear()
+
+    @patch("src.database.get_product_by_stripe_price_id")
+    def test_product_by_price_id_is_cached(self, mock_lookup):
+        """Test repeated price lookups hit the database once."""
+        from src.cache import get_product_by_price_id_cached
+
+        mock_lookup.return_value = {"id": 1, "stripe_price_id": "price_test123"}
+
+        first = get_product_by_price_id_cached("price_test123")
+        second = get_product_by_price_id_cached("price_test123")
+
+        self.assertEqual(first, second)
+        mock_lookup.assert_called_once_with("price_test123")
+
+    @patch("src.database.get_product_by_stripe_price_id")
+    def test_unknown_price_id_is_negatively_cached(self, mock_lookup):
+        """Test unknown price IDs are cached as misses."""
+        from src.cache import get_product_by_price_id_cached
+
+        mock_lookup.return_value = None
+
+        self.assertIsNone(get_product_by_price_id_cached("price_missing"))
+        self.assertIsNone(get_product_by_price_id_cached("price_missing"))
+        mock_lookup.assert_called_once()
+
+    @patch("src.database.get_product_by_stripe_price_id")
+    @patch("src.cache._get_redis_client")
+    def test_product_by_price_id_uses_shared_cache(self, mock_redis, mock_lookup):
+        """Test Redis is consulted before the database and filled on a miss."""
+        from src.cache import cache, get_product_by_price_id_cached
+
+        client = mock_redis.return_value
+        client.get.return_value = '{"id": 1, "stripe_price_id": "price_shared"}'
+
+        product = get_product_by_price_id_cached("price_shared")
+        self.assertEqual(product["id"], 1)
+        mock_lookup.assert_not_called()
+
+        cache.clear()
+        client.get.return_value = None
+        mock_lookup.return_value = {"id": 1, "stripe_price_id": "price_shared"}
+
+        get_product_by_price_id_cached("price_shared")
+        mock_lookup.assert_called_once_with("price_shared")
+        client.setex.assert_called_once()
+
+    @patch("src.database.get_user")
+    def test_stripe_customer_id_is_cached_once_assigned(self, mock_get_user):
+        """Test customer IDs are cached, but users without one are re-read."""
+        from src.cache import get_stripe_customer_id_cached
+
+        mock_get_user.return_value = {"telegram_id": 1, "stripe_customer_id": None}
+        self.assertIsNone(get_stripe_customer_id_cached(1))
+
+        mock_get_user.return_value = {"telegram_id": 1, "stripe_customer_id": "cus_1"}
+        self.assertEqual(get_stripe_customer_id_cached(1), "cus_1")
+        self.assertEqual(get_stripe_customer_id_cached(1), "cus_1")
+        self.assertEqual(mock_get_user.call_count, 2)
+
+    @patch("src.database.is_user_banned")
+    def test_ban_status_is_cached_until_invalidated(self, mock_is_banned):
+        """Test ban checks hit the database once until the user is invalidated."""
+        from src.cache import invalidate_user_cache, is_user_banned_cached
+
+        mock_is_banned.return_value = False
+        self.assertFalse(is_user_banned_cached(1))
+        self.assertFalse(is_user_banned_cached(1))
+        self.assertEqual(mock_is_banned.call_count, 1)
+
+        mock_is_banned.return_value = True
+        invalidate_user_cache(1)
+        self.assertTrue(is_user_banned_cached(1))
+
+    @patch("src.database.has_user_made_purchases")
+    def test_has_purchased_caches_only_positive_answers(self, mock_lookup):
+        """Test first-time buyers are re-checked until they purchase."""
+        from src.cache import has_user_made_purchases_cached, mark_user_has_purchased
+
+        mock_lookup.return_value = False
+        self.assertFalse(has_user_made_purchases_cached(1))
+        self.assertFalse(has_user_made_purchases_cached(1))
+        self.assertEqual(mock_lookup.call_count, 2)
+
+        mark_user_has_purchased(1)
+        self.assertTrue(has_user_made_purchases_cached(1))
+        self.assertEqual(mock_lookup.call_count, 2)
+
 
 if __name__ == "__main__":
     unittest.main()
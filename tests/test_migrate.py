@@ -0,0 +1,118 @@
+"""
+Migration runner tests for Enterprise Telegram Bot.
+
+These tests verify startup migrations are skipped or applied based on the
+recorded schema version.
+"""
+
+import unittest
+import sys
+import os
+from unittest.mock import MagicMock, patch
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class TestRunMigrationsOnce(unittest.TestCase):
+    """Test schema-version gated migrations."""
+
+    def setUp(self):
+        from src import migrate
+
+        self.migrate = migrate
+        patcher = patch.object(migrate, "_migrations_completed", False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @patch("src.migrate._apply_migrations")
+    @patch("src.database.advisory_lock")
+    @patch("src.database.get_schema_version")
+    def test_current_schema_skips_lock_and_migrations(
+        self, mock_version, mock_lock, mock_apply
+    ):
+        """Test a current schema costs one version query and nothing else."""
+        mock_version.return_value = self.migrate.SCHEMA_VERSION
+
+        self.migrate.run_migrations_once()
+
+        mock_version.assert_called_once()
+        mock_lock.assert_not_called()
+        mock_apply.assert_not_called()
+        self.assertTrue(self.migrate._migrations_completed)
+
+    @patch("src.database.set_schema_version")
+    @patch("src.migrate._apply_migrations")
+    @patch("src.database.advisory_lock")
+    @patch("src.database.get_schema_version")
+    def test_outdated_schema_applies_under_lock(
+        self, mock_version, mock_lock, mock_apply, mock_set_version
+    ):
+        """Test outdated schemas are migrated and the version recorded."""
+        mock_version.return_value = self.migrate.SCHEMA_VERSION - 1
+        mock_lock.return_value = MagicMock()
+
+        self.migrate.run_migrations_once()
+
+        mock_lock.assert_called_once_with(self.migrate.MIGRATION_LOCK_KEY)
+        mock_apply.assert_called_once()
+        mock_set_version.assert_called_once_with(self.migrate.SCHEMA_VERSION)
+
+    @patch("src.database.set_schema_version")
+    @patch("src.migrate._apply_migrations", return_value=False)
+    @patch("src.database.advisory_lock")
+    @patch("src.database.get_schema_version")
+    def test_failed_step_leaves_version_unrecorded(
+        self, mock_version, mock_lock, mock_apply, mock_set_version
+    ):
+        """Test a failed migration step is retried on the next start."""
+        mock_version.return_value = self.migrate.SCHEMA_VERSION - 1
+        mock_lock.return_value = MagicMock()
+
+        self.assertFalse(self.migrate.run_migrations_once())
+
+        mock_set_version.assert_not_called()
+        self.assertFalse(self.migrate._migrations_completed)
+
+    @patch("src.database.apply_webhook_events_migration", return_value=False)
+    def test_apply_migrations_reports_failed_steps(self, mock_webhook_step):
+        """Test one failing step fails the run while later steps still run."""
+        from src import database as db
+
+        steps = [
+            "apply_conversation_table_fix",
+            "apply_enhanced_ux_migration",
+            "apply_unread_tracking_migration",
+            "apply_conversations_updated_at_fix",
+            "apply_database_views_and_functions",
+            "clean_problematic_indexes",
+            "apply_performance_indexes_migration",
+            "apply_message_references_table_migration",
+            "ensure_sample_products",
+        ]
+        with patch.multiple(
+            db, **{step: MagicMock(return_value=True) for step in steps}
+        ):
+            self.assertFalse(self.migrate._apply_migrations())
+            db.ensure_sample_products.assert_called_once()
+
+        mock_webhook_step.assert_called_once()
+
+    @patch("src.migrate._apply_migrations")
+    @patch("src.database.advisory_lock")
+    @patch("src.database.get_schema_version")
+    def test_waiting_worker_skips_after_holder_finishes(
+        self, mock_version, mock_lock, mock_apply
+    ):
+        """Test a worker that waited on the lock re-checks and skips."""
+        mock_version.side_effect = [0, self.migrate.SCHEMA_VERSION]
+        mock_lock.return_value = MagicMock()
+
+        self.migrate.run_migrations_once()
+
+        mock_apply.assert_not_called()
+        self.assertTrue(self.migrate._migrations_completed)
+
+
+if __name__ == "__main__":
+    unittest.main()
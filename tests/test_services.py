@@ -0,0 +1,154 @@
+"""
+Service layer tests for Enterprise Telegram Bot.
+
+These tests verify retry and circuit breaker behavior without touching
+any external service.
+"""
+
+import unittest
+import sys
+import os
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.retry_service import (
+    RetryConfig,
+    RetryError,
+    RetryService,
+    RetryStrategy,
+    retry_after_hint,
+)
+
+
+class TestRetryConfig(unittest.TestCase):
+    """Test retry configuration."""
+
+    def test_exponential_delays_are_capped(self):
+        """Test exponential schedule is precomputed and capped at max_delay."""
+        config = RetryConfig(
+            max_attempts=5, base_delay=1.0, max_delay=5.0, jitter=False
+        )
+        self.assertEqual(config.base_delays, (1.0, 2.0, 4.0, 5.0, 5.0))
+
+    def test_linear_and_fixed_delays(self):
+        """Test linear and fixed strategies produce the expected schedule."""
+        linear = RetryConfig(
+            max_attempts=3, base_delay=2.0, strategy=RetryStrategy.LINEAR_BACKOFF
+        )
+        fixed = RetryConfig(
+            max_attempts=3, base_delay=2.0, strategy=RetryStrategy.FIXED_DELAY
+        )
+        self.assertEqual(linear.base_delays, (2.0, 4.0, 6.0))
+        self.assertEqual(fixed.base_delays, (2.0, 2.0, 2.0))
+
+    def test_delay_without_jitter(self):
+        """Test delay lookup uses the precomputed schedule."""
+        service = RetryService(RetryConfig(max_attempts=3, jitter=False))
+        self.assertEqual(service._calculate_delay(2), 2.0)
+
+    def test_full_jitter_stays_within_delay(self):
+        """Test full jitter never exceeds the capped delay."""
+        service = RetryService(RetryConfig(max_attempts=3, base_delay=1.0))
+        for _ in range(100):
+            self.assertTrue(0 <= service._calculate_delay(3) < 4.0)
+
+    def test_retryable_exception_matches_subclasses(self):
+        """Test exact and subclass matches are both retryable."""
+        service = RetryService(RetryConfig(retryable_exceptions=(OSError,)))
+        self.assertTrue(service._is_retryable_exception(OSError()))
+        self.assertTrue(service._is_retryable_exception(ConnectionError()))
+        self.assertFalse(service._is_retryable_exception(ValueError()))
+
+    def test_retry_after_hint(self):
+        """Test Retry-After headers are read and used as the retry delay."""
+        error = ConnectionError("rate limited")
+        error.headers = {"Retry-After": "3"}
+        self.assertEqual(retry_after_hint(error), 3.0)
+        self.assertIsNone(retry_after_hint(ConnectionError("no headers")))
+
+        service = RetryService(
+            RetryConfig(max_delay=10.0, delay_hint_fn=retry_after_hint)
+        )
+        self.assertEqual(service._get_retry_delay(1, error), 3.0)
+
+    def test_stripe_service_leaves_sdk_errors_to_the_sdk(self):
+        """Test Stripe's own retryable errors are not retried a second time."""
+        import stripe
+
+        from src.services.retry_service import get_stripe_retry_service
+
+        service = get_stripe_retry_service()
+        self.assertFalse(
+            service._is_retryable_exception(stripe.error.RateLimitError("slow"))
+        )
+        self.assertFalse(
+            service._is_retryable_exception(stripe.error.APIConnectionError("down"))
+        )
+
+
+class TestRetryService(unittest.IsolatedAsyncioTestCase):
+    """Test retry execution paths."""
+
+    def setUp(self):
+        self.service = RetryService(
+            RetryConfig(
+                max_attempts=3,
+                base_delay=0,
+                retryable_exceptions=(ConnectionError,),
+            )
+        )
+
+    async def test_async_retries_until_success(self):
+        """Test a retryable failure is retried and the result returned."""
+        calls = []
+
+        async def flaky():
+            calls.append(1)
+            if len(calls) < 3:
+                raise ConnectionError("down")
+            return "ok"
+
+        self.assertEqual(await self.service.execute_async(flaky), "ok")
+        self.assertEqual(len(calls), 3)
+
+    async def test_async_non_retryable_raises_immediately(self):
+        """Test non-retryable exceptions are re-raised without retrying."""
+        calls = []
+
+        async def broken():
+            calls.append(1)
+            raise ValueError("bad")
+
+        with self.assertRaises(ValueError):
+            await self.service.execute_async(broken)
+        self.assertEqual(len(calls), 1)
+
+    def test_sync_exhausted_raises_retry_error(self):
+        """Test RetryError carries the last exception once attempts run out."""
+
+        def always_down():
+            raise ConnectionError("down")
+
+        with self.assertRaises(RetryError) as ctx:
+            self.service.execute_sync(always_down)
+        self.assertIsInstance(ctx.exception.last_exception, ConnectionError)
+        self.assertEqual(ctx.exception.attempts, 3)
+
+    async def test_retry_with_exponential_backoff_dispatches_by_function_type(self):
+        """Test sync and async callables both run, sharing one cached service."""
+        from src.services.retry_service import retry_with_exponential_backoff
+
+        async def async_ok():
+            return "async"
+
+        def sync_ok():
+            return "sync"
+
+        self.assertEqual(await retry_with_exponential_backoff(async_ok), "async")
+        self.assertEqual(await retry_with_exponential_backoff(sync_ok), "sync")
+        self.assertFalse(hasattr(sync_ok, "__retry_is_coro__"))
+
+
+if __name__ == "__main__":
+    unittest.main()
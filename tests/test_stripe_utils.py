@@ -0,0 +1,430 @@
+"""
+Stripe utility tests for Enterprise Telegram Bot.
+
+These tests verify webhook event handling without calling the Stripe API.
+"""
+
+import hashlib
+import hmac
+import time
+import unittest
+import sys
+import os
+from unittest.mock import AsyncMock, MagicMock, patch
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class TestWebhookSignature(unittest.TestCase):
+    """Test webhook signature verification."""
+
+    def _sign(self, payload, secret):
+        timestamp = int(time.time())
+        signature = hmac.new(
+            secret.encode(), f"{timestamp}.{payload}".encode(), hashlib.sha256
+        ).hexdigest()
+        return f"t={timestamp},v1={signature}"
+
+    def test_valid_signature_returns_event_dict(self):
+        """Test a correctly signed payload is parsed into a plain dict."""
+        from src import stripe_utils
+
+        payload = '{"id": "evt_1", "type": "invoice.paid", "data": {"object": {}}}'
+        header = self._sign(payload, stripe_utils.STRIPE_WEBHOOK_SECRET)
+
+        event = stripe_utils.verify_webhook_signature(payload, header)
+
+        self.assertIsInstance(event, dict)
+        self.assertEqual(event["id"], "evt_1")
+
+    def test_invalid_signature_is_rejected(self):
+        """Test a payload signed with another secret is rejected."""
+        from src import stripe_utils
+
+        payload = '{"id": "evt_1", "type": "invoice.paid"}'
+        header = self._sign(payload, "whsec_other")
+
+        with self.assertRaises(stripe_utils.StripeError):
+            stripe_utils.verify_webhook_signature(payload, header)
+
+
+class TestWebhookDispatch(unittest.TestCase):
+    """Test Stripe webhook event dispatch."""
+
+    def test_known_event_is_routed_to_handler(self):
+        """Test a known event type reaches its handler."""
+        from src import stripe_utils
+
+        event = {"type": "payment_intent.payment_failed", "data": {"object": {}}}
+
+        with patch.dict(
+            stripe_utils._WEBHOOK_HANDLERS,
+            {"payment_intent.payment_failed": lambda e: False},
+        ):
+            self.assertFalse(stripe_utils.process_webhook_event(event))
+
+    def test_unhandled_event_is_acknowledged(self):
+        """Test unknown event types return True so Stripe doesn't retry."""
+        from src import stripe_utils
+
+        self.assertTrue(stripe_utils.process_webhook_event({"type": "invoice.paid"}))
+
+    def test_handler_exception_returns_false(self):
+        """Test handler errors are reported as processing failures."""
+        from src import stripe_utils
+
+        def broken(event):
+            raise RuntimeError("boom")
+
+        with patch.dict(
+            stripe_utils._WEBHOOK_HANDLERS, {"charge.dispute.created": broken}
+        ):
+            self.assertFalse(
+                stripe_utils.process_webhook_event({"type": "charge.dispute.created"})
+            )
+
+
+class TestWebhookQueue(unittest.TestCase):
+    """Test the durable webhook event queue."""
+
+    @patch("src.database.enqueue_webhook_event", return_value=True)
+    def test_enqueue_stores_raw_payload(self, mock_enqueue):
+        """Test events are queued by ID with their original body."""
+        from src import stripe_utils
+
+        event = {"id": "evt_1", "type": "invoice.paid"}
+
+        self.assertTrue(stripe_utils.enqueue_webhook_event(event, '{"id": "evt_1"}'))
+        mock_enqueue.assert_called_once_with("evt_1", "invoice.paid", '{"id": "evt_1"}')
+
+    @patch("src.database.finish_webhook_event")
+    @patch("src.database.claim_webhook_events")
+    def test_drain_records_each_outcome(self, mock_claim, mock_finish):
+        """Test claimed events are dispatched and their results recorded."""
+        from src import stripe_utils
+
+        mock_claim.return_value = [
+            {"id": 1, "event_id": "evt_1", "attempts": 1, "payload": {"type": "ok"}},
+            {"id": 2, "event_id": "evt_2", "attempts": 3, "payload": {"type": "bad"}},
+        ]
+
+        mock_finish.side_effect = ["done", "failed"]
+
+        with patch.dict(
+            stripe_utils._WEBHOOK_HANDLERS,
+            {"ok": lambda e: True, "bad": lambda e: False},
+        ):
+            with self.assertLogs("src.stripe_utils", level="ERROR") as logs:
+                self.assertEqual(stripe_utils.drain_webhook_events(), 2)
+
+        mock_finish.assert_any_call(1, True, 1)
+        mock_finish.assert_any_call(2, False, 3)
+        self.assertIn("evt_2 failed permanently", logs.output[0])
+
+
+class TestPaymentFailed(unittest.TestCase):
+    """Test payment_intent.payment_failed processing."""
+
+    @patch("src.database.check_failed_payments", create=True)
+    def test_manual_payment_skips_failure_count(self, mock_failures):
+        """Test the failure count is only read for auto-recharge payments."""
+        from src import stripe_utils
+
+        event = {
+            "data": {"object": {"id": "pi_1", "metadata": {"user_id": "1"}}},
+        }
+
+        self.assertTrue(stripe_utils.process_payment_failed(event))
+        mock_failures.assert_not_called()
+
+
+class TestCheckoutCompleted(unittest.TestCase):
+    """Test checkout.session.completed processing."""
+
+    def setUp(self):
+        self.event = {
+            "type": "checkout.session.completed",
+            "data": {
+                "object": {
+                    "id": "cs_test_123",
+                    "metadata": {
+                        "user_id": "12345",
+                        "product_id": "2",
+                        "transaction_id": "txn-1",
+                        "credits_granted": "25",
+                        "time_granted_seconds": "0",
+                        "is_first_purchase": "True",
+                    },
+                }
+            },
+        }
+
+    def test_event_record_parses_metadata(self):
+        """Test the checkout record converts metadata types once."""
+        from src.stripe_utils import CheckoutCompletedEvent
+
+        checkout = CheckoutCompletedEvent.from_event(self.event)
+
+        self.assertEqual(checkout.user_id, 12345)
+        self.assertEqual(checkout.product_id, 2)
+        self.assertEqual(checkout.credits_granted, 25)
+        self.assertTrue(checkout.is_first_purchase)
+
+    @patch("src.database.complete_transaction_and_add_credits")
+    def test_first_purchase_stores_auto_recharge_prompt(self, mock_complete):
+        """Test a first purchase stores the prompt with the credit grant."""
+        from src import stripe_utils
+
+        mock_complete.return_value = True
+
+        self.assertTrue(stripe_utils.process_checkout_completed(self.event))
+        mock_complete.assert_called_once_with(
+            user_id=12345,
+            transaction_id="txn-1",
+            credits_granted=25,
+            time_granted_seconds=0,
+            auto_recharge_prompt_product_id=2,
+        )
+
+
+class TestEnsureStripeCustomer(unittest.TestCase):
+    """Test Stripe customer provisioning."""
+
+    @patch("src.stripe_utils.create_stripe_customer")
+    @patch("src.stripe_utils.get_stripe_customer_id_cached", return_value="cus_1")
+    def test_existing_customer_is_reused(self, mock_cached, mock_create):
+        """Test no customer is created when one is already recorded."""
+        from src import stripe_utils
+
+        self.assertEqual(stripe_utils.ensure_stripe_customer(1), "cus_1")
+        mock_create.assert_not_called()
+
+    @patch("src.stripe_utils.create_stripe_customer", return_value="cus_new")
+    @patch("src.database.get_user", return_value={"telegram_id": 1})
+    @patch("src.stripe_utils.get_stripe_customer_id_cached", return_value=None)
+    def test_missing_customer_is_created(self, mock_cached, mock_user, mock_create):
+        """Test a customer is created from the user row when absent."""
+        from src import stripe_utils
+
+        self.assertEqual(stripe_utils.ensure_stripe_customer(1), "cus_new")
+        mock_create.assert_called_once_with(1, {"telegram_id": 1})
+
+
+class TestCustomerLookup(unittest.TestCase):
+    """Test resolving Stripe customers to Telegram users."""
+
+    @patch("stripe.Customer.retrieve")
+    @patch("src.database.get_user_by_stripe_customer_id")
+    def test_local_user_skips_stripe(self, mock_lookup, mock_retrieve):
+        """Test a known customer is resolved without a Stripe call."""
+        from src import stripe_utils
+
+        mock_lookup.return_value = {"telegram_id": 42}
+
+        self.assertEqual(stripe_utils.get_user_id_by_customer("cus_1"), 42)
+        mock_retrieve.assert_not_called()
+
+    @patch("stripe.Customer.retrieve")
+    @patch("src.database.get_user_by_stripe_customer_id", return_value=None)
+    def test_unknown_customer_falls_back_to_stripe(self, mock_lookup, mock_retrieve):
+        """Test customer metadata is used when no local user matches."""
+        from src import stripe_utils
+
+        mock_retrieve.return_value = {"metadata": {"telegram_id": "42"}}
+
+        self.assertEqual(stripe_utils.get_user_id_by_customer("cus_1"), 42)
+        mock_retrieve.assert_called_once_with("cus_1")
+
+
+@patch("src.database.has_user_made_purchases", return_value=True)
+@patch("src.stripe_utils.get_stripe_customer_id_cached", return_value="cus_123")
+@patch(
+    "src.stripe_utils.get_product_by_price_id_cached",
+    return_value={
+        "id": 2,
+        "name": "Pack",
+        "product_type": "credits",
+        "amount": 25,
+        "price_usd_cents": 500,
+    },
+)
+@patch("stripe.checkout.Session.create")
+class TestCreateCheckoutSession(unittest.TestCase):
+    """Test checkout session creation."""
+
+    @patch("src.database.update_transaction_status")
+    @patch("src.database.log_transaction")
+    def test_transaction_is_written_once_with_session_id(
+        self, mock_log, mock_update, mock_create, *_
+    ):
+        """Test the pending row is inserted after Stripe, in a single write."""
+        from src import stripe_utils
+
+        mock_create.return_value = MagicMock(id="cs_1", url="https://pay")
+
+        self.assertEqual(
+            stripe_utils.create_checkout_session(1, "price_1"), "https://pay"
+        )
+
+        metadata = mock_create.call_args.kwargs["metadata"]
+        mock_log.assert_called_once()
+        self.assertEqual(mock_log.call_args.kwargs["stripe_session_id"], "cs_1")
+        self.assertEqual(
+            mock_log.call_args.kwargs["transaction_id"], metadata["transaction_id"]
+        )
+        mock_update.assert_not_called()
+
+    @patch("stripe.checkout.Session.expire")
+    @patch("src.database.log_transaction", side_effect=RuntimeError("db down"))
+    def test_session_is_expired_when_insert_fails(
+        self, mock_log, mock_expire, mock_create, *_
+    ):
+        """Test an unrecorded session is expired so it can't be paid."""
+        from src import stripe_utils
+
+        mock_create.return_value = MagicMock(id="cs_1", url="https://pay")
+
+        with self.assertRaises(stripe_utils.StripeError):
+            stripe_utils.create_checkout_session(1, "price_1")
+        mock_expire.assert_called_once_with("cs_1")
+
+
+class TestAutoRecharge(unittest.TestCase):
+    """Test auto-recharge payment creation."""
+
+    @patch("src.database.get_user")
+    @patch("src.database.check_failed_payments", create=True, return_value=0)
+    @patch("stripe.PaymentIntent.create")
+    @patch("src.stripe_utils.get_product_by_price_id_cached")
+    @patch("src.stripe_utils.get_stripe_customer_id_cached")
+    def test_idempotency_key_follows_balance_state(
+        self, mock_customer, mock_product, mock_create, mock_failures, mock_user
+    ):
+        """Test triggers share a key until the user's balance changes."""
+        from datetime import datetime, timezone
+
+        from src import stripe_utils
+
+        mock_customer.return_value = "cus_123"
+        mock_product.return_value = {"price_usd_cents": 500}
+        mock_create.return_value.last_response = None
+        before = {
+            "message_credits": 2,
+            "updated_at": datetime(2026, 1, 1, 12, 59, tzinfo=timezone.utc),
+        }
+        after = dict(
+            before, updated_at=datetime(2026, 1, 1, 13, 5, tzinfo=timezone.utc)
+        )
+        mock_user.side_effect = [before, before, after]
+
+        for _ in range(3):
+            self.assertTrue(stripe_utils.trigger_auto_recharge(1, "price_1", "Pack"))
+
+        first, second, third = (
+            call.kwargs["idempotency_key"] for call in mock_create.call_args_list
+        )
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, third)
+        self.assertTrue(first.startswith("autorecharge:1:"))
+
+    @patch("src.database.get_user", return_value={"message_credits": 2})
+    @patch("src.database.check_failed_payments", create=True, return_value=0)
+    @patch("stripe.PaymentIntent.create")
+    @patch("src.stripe_utils.get_product_by_price_id_cached")
+    @patch("src.stripe_utils.get_stripe_customer_id_cached")
+    def test_replayed_attempt_is_not_reported_as_new_charge(
+        self, mock_customer, mock_product, mock_create, mock_failures, mock_user
+    ):
+        """Test Stripe's idempotent replay is not treated as a new recharge."""
+        from src import stripe_utils
+
+        mock_customer.return_value = "cus_123"
+        mock_product.return_value = {"price_usd_cents": 500}
+        mock_create.return_value.last_response.headers = {"Idempotent-Replayed": "true"}
+
+        self.assertIsNone(stripe_utils.trigger_auto_recharge(1, "price_1", "Pack"))
+
+    @patch("src.database.get_user", return_value={"message_credits": 2})
+    @patch("src.database.check_failed_payments", create=True, return_value=0)
+    @patch("stripe.PaymentIntent.create")
+    @patch("src.stripe_utils.get_product_by_price_id_cached")
+    @patch("src.stripe_utils.get_stripe_customer_id_cached")
+    def test_replayed_decline_is_not_reported_again(
+        self, mock_customer, mock_product, mock_create, mock_failures, mock_user
+    ):
+        """Test a decline replayed by Stripe does not notify the user again."""
+        import asyncio
+
+        import stripe
+
+        from src import stripe_utils
+
+        mock_customer.return_value = "cus_123"
+        mock_product.return_value = {"price_usd_cents": 500}
+        mock_create.side_effect = stripe.error.CardError(
+            "Your card was declined.",
+            None,
+            "card_declined",
+            headers={"idempotent-replayed": "true"},
+        )
+        telegram_app = MagicMock()
+        telegram_app.bot.send_message = AsyncMock()
+        user_data = {"telegram_id": 1, "product_name": "Pack", "stripe_price_id": "p"}
+
+        self.assertIsNone(stripe_utils.trigger_auto_recharge(1, "price_1", "Pack"))
+        asyncio.run(
+            stripe_utils._auto_recharge_user(
+                telegram_app, user_data, asyncio.Semaphore(1), asyncio.Semaphore(1)
+            )
+        )
+        telegram_app.bot.send_message.assert_not_called()
+
+
+class TestProcessAutoRechargeUsers(unittest.IsolatedAsyncioTestCase):
+    """Test the periodic auto-recharge job."""
+
+    @patch("src.stripe_utils.trigger_auto_recharge")
+    @patch("src.database.get_users_needing_auto_recharge", create=True)
+    async def test_every_user_is_recharged_and_notified(self, mock_users, mock_trigger):
+        """Test each user is processed even when one recharge fails."""
+        from src import stripe_utils
+
+        mock_users.return_value = [
+            {"telegram_id": uid, "product_name": "Pack", "stripe_price_id": "p"}
+            for uid in (1, 2, 3)
+        ]
+        mock_trigger.side_effect = lambda uid, price, name: uid != 2
+        telegram_app = MagicMock()
+        telegram_app.bot.send_message = AsyncMock()
+
+        await stripe_utils.process_auto_recharge_users(telegram_app)
+
+        self.assertEqual(mock_trigger.call_count, 3)
+        sent = {
+            call.kwargs["chat_id"]: call.kwargs["text"]
+            for call in telegram_app.bot.send_message.call_args_list
+        }
+        self.assertEqual(set(sent), {1, 2, 3})
+        self.assertIn("Failed", sent[2])
+
+    @patch("src.stripe_utils.trigger_auto_recharge", return_value=None)
+    @patch("src.database.get_users_needing_auto_recharge", create=True)
+    async def test_replayed_recharge_is_not_notified(self, mock_users, mock_trigger):
+        """Test a replayed attempt sends neither a success nor a failure message."""
+        from src import stripe_utils
+
+        mock_users.return_value = [
+            {"telegram_id": 1, "product_name": "Pack", "stripe_price_id": "p"}
+        ]
+        telegram_app = MagicMock()
+        telegram_app.bot.send_message = AsyncMock()
+
+        await stripe_utils.process_auto_recharge_users(telegram_app)
+
+        mock_trigger.assert_called_once()
+        telegram_app.bot.send_message.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+"""
+Validator tests for Enterprise Telegram Bot.
+
+These tests verify input validation helpers without touching the database.
+"""
+
+import unittest
+import sys
+import os
+from unittest.mock import AsyncMock, MagicMock, patch
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class TestInputValidator(unittest.TestCase):
+    """Test input validation helpers."""
+
+    def test_sanitize_text_input_collapses_whitespace(self):
+        """Test runs of whitespace collapse to single spaces."""
+        from src.validators import InputValidator
+
+        self.assertEqual(
+            InputValidator.sanitize_text_input("  hello \n\t world  "), "hello world"
+        )
+
+    def test_validate_username(self):
+        """Test username length and character rules."""
+        from src.validators import InputValidator
+
+        self.assertTrue(InputValidator.validate_username("@valid_name1"))
+        self.assertFalse(InputValidator.validate_username("abcd"))
+        self.assertFalse(InputValidator.validate_username("a" * 33))
+        self.assertFalse(InputValidator.validate_username("bad-name"))
+        self.assertFalse(InputValidator.validate_username("trailing\n"))
+        self.assertFalse(InputValidator.validate_username("ünïcode_name"))
+
+    def test_integer_validators(self):
+        """Test ID and credit validators share the same range checks."""
+        from src.validators import InputValidator
+
+        self.assertEqual(InputValidator.validate_telegram_id("42"), (True, 42))
+        self.assertEqual(InputValidator.validate_telegram_id(0), (False, None))
+        self.assertEqual(InputValidator.validate_product_id("x"), (False, None))
+        self.assertEqual(InputValidator.validate_product_id(None), (False, None))
+        self.assertEqual(InputValidator.validate_credit_amount("10000"), (True, 10000))
+        self.assertEqual(InputValidator.validate_credit_amount(10001), (False, None))
+
+
+class TestValidateUserAndCredits(unittest.IsolatedAsyncioTestCase):
+    """Test combined user and credit validation."""
+
+    def setUp(self):
+        self.update = MagicMock()
+        self.update.effective_user.id = 1
+        self.context = MagicMock()
+
+    @patch("src.validators.ErrorService.handle_error", new_callable=AsyncMock)
+    @patch("src.database.is_user_banned")
+    @patch("src.database.get_or_create_user")
+    async def test_banned_flag_comes_from_upserted_row(
+        self, mock_upsert, mock_is_banned, mock_handle_error
+    ):
+        """Test a banned user is rejected without a separate ban query."""
+        from src.validators import validate_user_and_credits
+
+        mock_upsert.return_value = {"is_banned": True, "message_credits": 10}
+
+        self.assertIsNone(await validate_user_and_credits(self.update, self.context))
+        mock_upsert.assert_called_once()
+        mock_is_banned.assert_not_called()
+        mock_handle_error.assert_awaited_once()
+
+    @patch("src.validators.ErrorService.handle_error", new_callable=AsyncMock)
+    @patch("src.database.get_or_create_user")
+    async def test_user_with_credits_passes(self, mock_upsert, mock_handle_error):
+        """Test a user with enough credits gets their row back."""
+        from src.validators import validate_user_and_credits
+
+        row = {"is_banned": False, "message_credits": 3}
+        mock_upsert.return_value = row
+
+        self.assertEqual(
+            await validate_user_and_credits(self.update, self.context, 2), row
+        )
+        mock_handle_error.assert_not_awaited()
+
+
+if __name__ == "__main__":
+    unittest.main()